@@ -0,0 +1,213 @@
+"""
+Anomaly scoring worker
+Tails siem-logs-* by ingest time (ANOMALY_WATERMARK_FIELD) and scores every
+new event against streaming per-IP / per-event baselines (models/anomaly.py).
+The top outliers of each minute are kept in Redis sorted sets, which back
+/api/logs/anomalies. Baselines are snapshotted to Redis together with their
+watermark, so a restart resumes where the snapshot left off
+Run next to the API: python anomaly_worker.py
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import time
+
+from elasticsearch import Elasticsearch
+
+from config import Config
+from models.anomaly import AnomalyDetector, outlier_key
+from models.cache import CacheManager
+from models.guard import CircuitBreaker
+from responses import dumps
+
+
+SNAPSHOT_KEY = "anomaly:state"
+BATCH_SIZE = 5000
+
+
+def new_detector() -> AnomalyDetector:
+    return AnomalyDetector(
+        short_half_life=Config.ANOMALY_SHORT_HALF_LIFE_SECONDS,
+        long_half_life=Config.ANOMALY_LONG_HALF_LIFE_SECONDS,
+        profile_half_life=Config.ANOMALY_PROFILE_HALF_LIFE_SECONDS,
+        max_entities=Config.ANOMALY_MAX_ENTITIES,
+        idle_seconds=Config.ANOMALY_IDLE_SECONDS,
+        max_event_age=Config.ANOMALY_MAX_EVENT_AGE_SECONDS
+    )
+
+
+def epoch_ms(dt: datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
+class AnomalyWorker:
+    """
+    Feeds newly ingested events through the detector, one tick at a time
+    A tick covers (watermark, now - lag] completely, so the watermark only
+    moves once every document up to it has been scored
+    """
+
+    def __init__(self, es, cache: CacheManager, breaker: CircuitBreaker = None):
+        self.es = es
+        self.cache = cache
+        self.breaker = breaker or CircuitBreaker("elasticsearch")
+        self.detector = new_detector()
+        self.watermark_ms = None
+        self.snapshot_at = 0.0
+        # False until state is restored or bootstrapped; ticks wait for it
+        self.ready = False
+        # Bootstrapped state must never replace a snapshot someone else wrote
+        self.bootstrapped = False
+
+    def load(self) -> bool:
+        """
+        Restore the last snapshot, or start from ANOMALY_BOOTSTRAP_HOURS ago
+        when there is none (or it is unusable)
+        Returns False, leaving the worker not ready, while Redis is unavailable:
+        bootstrapping then would throw away a good snapshot
+        """
+        self.ready = False
+        available, snapshot = self.cache.get_blob(SNAPSHOT_KEY)
+        if not available:
+            print("❌ Redis unavailable, anomaly baselines not loaded yet")
+            return False
+
+        self.detector = new_detector()
+        self.watermark_ms = None
+        self.bootstrapped = snapshot is None
+        if snapshot is not None:
+            try:
+                self.watermark_ms = self.detector.restore(snapshot)
+            except Exception as e:
+                print(f"❌ Could not restore anomaly baselines: {e}")
+                self.detector = new_detector()
+
+        now = datetime.now(timezone.utc)
+        if self.watermark_ms is None:
+            self.watermark_ms = epoch_ms(now - timedelta(hours=Config.ANOMALY_BOOTSTRAP_HOURS))
+            print(f"🆕 Learning anomaly baselines from the last {Config.ANOMALY_BOOTSTRAP_HOURS}h")
+        else:
+            if self.detector.clock > now.timestamp():
+                # Written before event times were capped at ingest time
+                print(f"⚠️  Snapshot clock {self.detector.clock} is in the future, resetting it to now")
+                self.detector.clock = now.timestamp()
+            print(f"✅ Restored anomaly baselines: {self.detector.stats()}")
+        self.ready = True
+        return True
+
+    def save(self) -> bool:
+        if not self.ready:
+            return False
+        saved = self.cache.set_blob(
+            SNAPSHOT_KEY,
+            self.detector.to_snapshot(self.watermark_ms),
+            only_if_missing=self.bootstrapped
+        )
+        if saved is False:
+            # Another worker saved baselines since we bootstrapped: use them
+            print("⚠️  Found existing anomaly baselines, reloading them")
+            self.load()
+            return False
+        if saved:
+            self.snapshot_at = time.monotonic()
+            self.bootstrapped = False
+        return bool(saved)
+
+    def _iter_new_events(self, upper_ms: int):
+        field = Config.ANOMALY_WATERMARK_FIELD
+        pit_id = self.breaker.call(self.es.open_point_in_time, index="siem-logs-*", keep_alive="2m")["id"]
+        try:
+            search_after = None
+            while True:
+                resp = self.breaker.call(
+                    self.es.search,
+                    pit={"id": pit_id, "keep_alive": "2m"},
+                    query={"range": {field: {"gt": self.watermark_ms, "lte": upper_ms, "format": "epoch_millis"}}},
+                    size=BATCH_SIZE,
+                    # Ingest order; sort[1] is the event's own @timestamp in epoch millis
+                    sort=[{field: {"order": "asc"}}, {"@timestamp": {"order": "asc", "missing": "_first"}}],
+                    search_after=search_after,
+                    source=["timestamp", "ip", "event"]
+                )
+                hits = resp["hits"]["hits"]
+                if not hits:
+                    return
+                yield hits
+                search_after = hits[-1]["sort"]
+                pit_id = resp.get("pit_id", pit_id)
+        finally:
+            try:
+                self.es.close_point_in_time(id=pit_id)
+            except Exception as e:
+                print(f"Error closing point in time: {e}")
+
+    def run_tick(self, now: datetime = None) -> dict:
+        if not self.ready and not self.load():
+            return {"scored": 0, "outliers": 0}
+
+        now = now or datetime.now(timezone.utc)
+        upper_ms = epoch_ms(now - timedelta(seconds=Config.ANOMALY_INGEST_LAG_SECONDS))
+        if upper_ms <= self.watermark_ms:
+            return {"scored": 0, "outliers": 0}
+
+        scored = outliers = 0
+        try:
+            for hits in self._iter_new_events(upper_ms):
+                ranked = defaultdict(dict)
+                for h in hits:
+                    src = h.get("_source", {})
+                    # Event time, capped at the ingest time (bounded by upper_ms) so a
+                    # bogus future @timestamp cannot run the detector clock ahead;
+                    # no @timestamp: the ingest time itself
+                    ingested_ms = h["sort"][0]
+                    ts_ms = min(h["sort"][1], ingested_ms) if h["sort"][1] > 0 else ingested_ms
+                    result = self.detector.score(ts_ms, src.get("ip"), src.get("event"))
+                    if result is None:
+                        continue
+                    scored += 1
+                    if result["score"] >= Config.ANOMALY_MIN_SCORE:
+                        member = dumps({
+                            "id": h["_id"],
+                            "timestamp": src.get("timestamp"),
+                            "ip": src.get("ip"),
+                            "event": src.get("event"),
+                            "components": result["components"]
+                        }).decode()
+                        ranked[outlier_key(ts_ms // 60000)][member] = result["score"]
+                        outliers += 1
+                if ranked:
+                    self.cache.add_ranked(ranked, Config.ANOMALY_KEEP_PER_MINUTE, Config.ANOMALY_RETENTION_SECONDS)
+        except Exception as e:
+            # Part of the window is already learned: roll back to the snapshot
+            # so those events are not counted twice when the window is retried
+            print(f"❌ Anomaly tick failed, reloading last snapshot: {e}")
+            self.load()
+            return {"scored": 0, "outliers": 0}
+
+        self.watermark_ms = upper_ms
+        evicted = self.detector.evict_idle()
+        if time.monotonic() - self.snapshot_at >= Config.ANOMALY_SNAPSHOT_SECONDS:
+            self.save()
+
+        if scored:
+            print(f"🔎 Scored {scored} events, {outliers} outliers, evicted {evicted} idle entities "
+                  f"({self.detector.stats()})")
+        return {"scored": scored, "outliers": outliers}
+
+
+if __name__ == '__main__':
+    es_breaker = CircuitBreaker("elasticsearch", Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_SECONDS)
+    cache = CacheManager(
+        breaker=CircuitBreaker("redis", Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_SECONDS)
+    )
+    worker = AnomalyWorker(Elasticsearch(['http://localhost:9200']), cache, breaker=es_breaker)
+    worker.load()
+
+    try:
+        while True:
+            started = time.monotonic()
+            worker.run_tick()
+            time.sleep(max(0, Config.ANOMALY_TICK_SECONDS - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        worker.save()
+        print("💾 Saved anomaly baselines")
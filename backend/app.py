@@ -1,10 +1,22 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 from elasticsearch import Elasticsearch
-from models.cache import CacheManager
-from severity_mapping import get_severity
+from config import Config
+from models.cache import CacheManager, CachedBody
+from models.anomaly import outlier_key
+from models.archive import ArchiveStore
+from models.guard import CircuitBreaker, CircuitOpenError, RateLimiter
+from responses import dumps, json_response, loads, make_etag, merge, splice
+from search_query import (
+    PAGE_SIZE, archive_window, build_search_query, estimate_search_cost, exclude_indices, parse_date
+)
+from severity_mapping import get_severity, get_severity_version, mapping_store, severity_of
 from datetime import datetime, timezone
+import csv
+import io
+import itertools
 import os
 
 
@@ -23,6 +35,10 @@ def allowed_file(filename):
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Behind a reverse proxy, trust only the X-Forwarded-For hops it appends
+if Config.TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXY_HOPS)
+
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -32,8 +48,85 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 es = Elasticsearch(['http://localhost:9200'])
 
 
+# Dependency guards: fail fast instead of waiting out client timeouts
+es_breaker = CircuitBreaker("elasticsearch", Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_SECONDS)
+mongo_breaker = CircuitBreaker("mongodb", Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_SECONDS)
+# Severity mapping reloads from MongoDB share the API's Mongo circuit
+mapping_store.breaker = mongo_breaker
+
+
 # Initialize Redis Cache
-cache = CacheManager()
+cache = CacheManager(
+    breaker=CircuitBreaker("redis", Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_SECONDS)
+)
+
+
+# Cold-tier archive of daily indices past hot retention (see archiver.py)
+archive = ArchiveStore(Config.ARCHIVE_ROOT)
+
+
+# Per-client token buckets: every API call costs 1 token, searches also
+# spend their estimated cost from a separate search budget
+api_limiter = RateLimiter(cache, "api", Config.RATE_LIMIT_CAPACITY, Config.RATE_LIMIT_REFILL_PER_SEC)
+search_limiter = RateLimiter(cache, "search", Config.SEARCH_BUDGET_CAPACITY, Config.SEARCH_BUDGET_REFILL_PER_SEC)
+
+
+
+def cache_panel(key, value, ttl):
+    """
+    Encode a dashboard panel once and cache the bytes with their ETag and
+    the time they were computed, so hits are served without re-encoding
+    """
+    body = dumps(value)
+    panel = CachedBody(body, make_etag(body), datetime.now(timezone.utc).isoformat())
+    cache.set_body(key, panel, ttl=ttl, stale_ttl=Config.STALE_CACHE_TTL)
+    return panel
+
+
+
+def stale_panel(key):
+    """
+    Last good value of a panel, served while its data source is failing
+    """
+    return cache.get_body(f"{key}:stale")
+
+
+
+def client_id():
+    """
+    Identify the caller for rate limiting
+    remote_addr is the peer address, or the client address resolved by
+    ProxyFix from trusted hops only, so callers cannot pick their own bucket
+    """
+    return request.remote_addr or "unknown"
+
+
+
+def too_many_requests(retry_after):
+    response = jsonify({
+        "error": "Rate limit exceeded",
+        "retry_after_seconds": round(retry_after, 1)
+    })
+    response.headers['Retry-After'] = str(max(1, round(retry_after)))
+    return response, 429
+
+
+
+@app.before_request
+def admission_control():
+    """
+    Per-client rate limit on every API call except health checks, so a busy
+    client cannot get the orchestrator's probes rejected
+    """
+    if not request.path.startswith('/api/') or request.method == 'OPTIONS':
+        return None
+    if request.endpoint in ('health', 'dependencies_health'):
+        return None
+    
+    allowed, retry_after = api_limiter.consume(client_id())
+    if not allowed:
+        return too_many_requests(retry_after)
+    return None
 
 
 
@@ -54,6 +147,19 @@ def health():
 
 
 
+@app.route('/api/health/dependencies', methods=['GET'])
+def dependencies_health():
+    """
+    Circuit breaker state for Elasticsearch, MongoDB and Redis
+    """
+    return jsonify({
+        "elasticsearch": es_breaker.status(),
+        "mongodb": mongo_breaker.status(),
+        "redis": cache.breaker.status()
+    }), 200
+
+
+
 # ==================== FILE UPLOAD ENDPOINTS ====================
 
 
@@ -92,7 +198,7 @@ def upload_log():
             f.write(file_content)
         
         # US-MONGO-2: Save metadata to MongoDB
-        metadata = FileMetadata()
+        metadata = FileMetadata(breaker=mongo_breaker)
         upload_doc = metadata.save_upload(
             filename=filename,
             size=file_size,
@@ -128,7 +234,7 @@ def get_upload_history():
     from models.file_metadata import FileMetadata
     
     try:
-        metadata = FileMetadata()
+        metadata = FileMetadata(breaker=mongo_breaker)
         history = metadata.get_upload_history(limit=50)
         
         return jsonify({
@@ -141,6 +247,218 @@ def get_upload_history():
 
 
 
+# ==================== SAVED SEARCH ENDPOINTS ====================
+
+
+@app.route('/api/searches', methods=['POST'])
+def create_saved_search():
+    """
+    Save a search to be evaluated on a schedule (see scheduler.py)
+    JSON body:
+    - name: required
+    - ip, event: same filters as /api/logs/search
+    - interval_seconds: schedule (default 60)
+    - threshold: new hits per run that raise an alert (default 1)
+    """
+    from models.saved_search import SavedSearch
+    
+    data = request.get_json(silent=True) or {}
+    name = str(data.get('name', '')).strip()
+    if not name:
+        return jsonify({"error": "name is required"}), 400
+    
+    try:
+        interval_seconds = int(data.get('interval_seconds', 60))
+        threshold = int(data.get('threshold', 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "interval_seconds and threshold must be integers"}), 400
+    
+    if interval_seconds < 10 or threshold < 1:
+        return jsonify({"error": "interval_seconds must be >= 10 and threshold >= 1"}), 400
+    
+    saved = SavedSearch(breaker=mongo_breaker)
+    doc = saved.create(
+        name=name,
+        ip=str(data.get('ip', '')).strip(),
+        event=str(data.get('event', '')).strip(),
+        interval_seconds=interval_seconds,
+        threshold=threshold
+    )
+    if doc["_id"] == "error":
+        return jsonify(doc), 503
+    
+    return jsonify(doc), 201
+
+
+
+@app.route('/api/searches', methods=['GET'])
+def list_saved_searches():
+    """
+    List saved searches with their watermark and last hit counts
+    """
+    from models.saved_search import SavedSearch
+    
+    searches = SavedSearch(breaker=mongo_breaker).get_saved_searches()
+    return jsonify({
+        "searches": searches,
+        "count": len(searches)
+    }), 200
+
+
+
+@app.route('/api/searches/<search_id>', methods=['DELETE'])
+def delete_saved_search(search_id):
+    """
+    Delete a saved search
+    """
+    from models.saved_search import SavedSearch
+    
+    if not SavedSearch(breaker=mongo_breaker).delete(search_id):
+        return jsonify({"error": "Saved search not found"}), 404
+    
+    return jsonify({"status": "deleted", "id": search_id}), 200
+
+
+
+@app.route('/api/alerts', methods=['GET'])
+def get_alerts():
+    """
+    Alerts raised by saved searches, newest first
+    Query params:
+    - saved_search_id: only alerts for this saved search
+    - limit: default 50, max 500
+    """
+    from models.saved_search import SavedSearch
+    
+    limit = min(max(1, request.args.get('limit', 50, type=int)), 500)
+    alerts = SavedSearch(breaker=mongo_breaker).get_alerts(
+        limit=limit,
+        saved_search_id=request.args.get('saved_search_id')
+    )
+    return jsonify({
+        "alerts": alerts,
+        "count": len(alerts)
+    }), 200
+
+
+
+# ==================== DASHBOARD PANELS ====================
+
+
+CRITICAL_EVENT_WORDS = ["brute_force_attack", "unauthorized_access", "privilege_escalation"]
+
+
+def _parse_latest_logs(resp):
+    logs = []
+    for h in resp["hits"]["hits"]:
+        src = h.get("_source", {})
+        severity, severity_version = severity_of(src)
+        logs.append({
+            "timestamp": src.get("timestamp"),
+            "ip": src.get("ip"),
+            "event": src.get("event", ""),
+            "severity": severity,
+            "severity_version": severity_version,
+        })
+    return logs
+
+
+def _parse_stats(resp):
+    aggs = resp["aggregations"]
+    return {
+        "total_logs": resp["hits"]["total"]["value"],
+        "failed_logins": aggs["failed_logins"]["doc_count"],
+        "unique_ips": aggs["unique_ips"]["value"],
+        "critical_events": aggs["critical_events"]["doc_count"],
+        "logs_today": 0
+    }
+
+
+def _parse_unique_ips(resp):
+    ips = [
+        {"ip": bucket["key"], "count": bucket["doc_count"]}
+        for bucket in resp["aggregations"]["unique_ips"]["buckets"]
+    ]
+    ips.sort(key=lambda x: x["count"], reverse=True)
+    return ips
+
+
+def _parse_unique_events(resp):
+    version = get_severity_version()
+    events = [
+        {
+            "event": bucket["key"],
+            "count": bucket["doc_count"],
+            "severity": get_severity(bucket["key"]),
+            "severity_version": version,
+        }
+        for bucket in resp["aggregations"]["unique_events"]["buckets"]
+    ]
+    events.sort(key=lambda x: x["count"], reverse=True)
+    return events
+
+
+# Panel name -> ES search body, response parser, cache TTL and fallback value.
+# Panel names double as the cache keys used by the per-panel endpoints.
+DASHBOARD_PANELS = {
+    "latest_logs": {
+        "body": {"size": 50, "sort": [{"@timestamp": {"order": "desc"}}]},
+        "parse": _parse_latest_logs,
+        "ttl": 30,
+        "fallback": [],
+    },
+    "stats": {
+        # Same figures as /api/logs/stats, folded into a single request
+        "body": {
+            "size": 0,
+            "aggs": {
+                "failed_logins": {"filter": {"match": {"event": "login_failed"}}},
+                "unique_ips": {"cardinality": {"field": "ip.keyword"}},
+                "critical_events": {
+                    "filter": {
+                        "bool": {
+                            "must": [{"match": {"event": word}} for word in CRITICAL_EVENT_WORDS]
+                        }
+                    }
+                },
+            },
+        },
+        "parse": _parse_stats,
+        "ttl": 60,
+        "fallback": {
+            "total_logs": 0,
+            "failed_logins": 0,
+            "unique_ips": 0,
+            "critical_events": 0,
+        },
+    },
+    "unique_ips": {
+        "body": {"size": 0, "aggs": {"unique_ips": {"terms": {"field": "ip.keyword", "size": 1000}}}},
+        "parse": _parse_unique_ips,
+        "ttl": 300,
+        "fallback": [],
+    },
+    "unique_events": {
+        "body": {"size": 0, "aggs": {"unique_events": {"terms": {"field": "event.keyword", "size": 100}}}},
+        "parse": _parse_unique_events,
+        "ttl": 300,
+        "fallback": [],
+    },
+}
+
+
+
+def fetch_panel(name):
+    """
+    Run one panel's ES search, then encode and cache the parsed result
+    Used by the per-panel endpoints; the snapshot batches the same bodies in an msearch
+    """
+    panel = DASHBOARD_PANELS[name]
+    resp = es_breaker.call(es.search, index="siem-logs-*", **panel["body"])
+    return cache_panel(name, panel["parse"](resp), ttl=panel["ttl"])
+
+
+
 # ==================== LOG SEARCH ENDPOINTS ====================
 
 
@@ -151,37 +469,33 @@ def latest_logs():
     Cache TTL: 30 seconds
     """
     # Check cache first
-    cached = cache.get_cache("latest_logs")
+    cached = cache.get_body("latest_logs")
     if cached:
         print("✅ Cache HIT for latest_logs")
-        return jsonify({"logs": cached, "source": "cache"}), 200
+        body = splice({"logs": cached.body, "source": dumps("cache")})
+        return json_response(body, etag=f"cache-{cached.etag}")
     
     print("⏳ Cache MISS for latest_logs - fetching from ES")
     
     try:
-        resp = es.search(
-            index="siem-logs-*",
-            size=50,
-            sort=[{"@timestamp": {"order": "desc"}}]
-        )
-        logs = []
-        for h in resp["hits"]["hits"]:
-            src = h.get("_source", {})
-            event = src.get("event", "")
-            logs.append({
-                "timestamp": src.get("timestamp"),
-                "ip": src.get("ip"),
-                "event": event,
-                "severity": get_severity(event),
-            })
+        # Cached for 30 seconds
+        panel = fetch_panel("latest_logs")
         
-        # Cache for 30 seconds
-        cache.set_cache("latest_logs", logs, ttl=30)
-        
-        return jsonify({"logs": logs, "source": "elasticsearch"}), 200
+        body = splice({"logs": panel.body, "source": dumps("elasticsearch")})
+        return json_response(body, etag=f"elasticsearch-{panel.etag}")
         
     except Exception as e:
         print(f"Error fetching logs: {e}")
+        # Serve the last good value while ES is failing
+        stale = stale_panel("latest_logs")
+        if stale:
+            body = splice({
+                "logs": stale.body,
+                "source": dumps("stale"),
+                "generated_at": dumps(stale.generated_at)
+            })
+            return json_response(body, etag=f"stale-{stale.etag}")
+        
         # Return mock data if ES is down
         return jsonify({
             "logs": [],
@@ -199,8 +513,10 @@ def search_logs():
     - ip: filter by IP address
     - event: filter by event type
     - start_date: filter by start date (ISO 8601)
+      (default: last SEARCH_DEFAULT_WINDOW_DAYS days, reported as "downgraded")
     - end_date: filter by end date (ISO 8601)
     - page: pagination (default 1)
+    Ranges reaching past HOT_RETENTION_DAYS also search the cold-tier archive
     """
     try:
         # Get query parameters from frontend
@@ -213,52 +529,44 @@ def search_logs():
         
         print(f"🔍 Search filters - IP: {ip_filter}, Event: {event_filter}, Start: {start_date}, End: {end_date}, Page: {page}")
         
-        # Build Elasticsearch query filters
-        must_filters = []
-        
-        # Add IP filter
-        if ip_filter:
-            must_filters.append({"term": {"ip.keyword": ip_filter}})
-        
-        # Add event type filter
-        if event_filter:
-            must_filters.append({"term": {"event.keyword": event_filter}})
-        
-        # Add date range filter
-        if start_date or end_date:
-            date_range = {}
-            if start_date:
-                date_range["gte"] = start_date
-            if end_date:
-                date_range["lte"] = end_date
-            
-            if date_range:
-                must_filters.append({
-                    "range": {
-                        "@timestamp": date_range
-                    }
-                })
-        
-        # Build final ES query
-        if must_filters:
-            es_query = {
-                "bool": {
-                    "must": must_filters
-                }
-            }
-        else:
-            es_query = {"match_all": {}}
+        # Admission control: reject or narrow unbounded searches, then
+        # charge the estimated cost to the client's search budget
+        estimate = estimate_search_cost(ip_filter, event_filter, start_date, end_date, page)
+        if estimate.action == "reject":
+            return jsonify({
+                "error": estimate.reason,
+                "logs": [],
+                "total": 0,
+                "page": page
+            }), 400
+        
+        allowed, retry_after = search_limiter.consume(client_id(), estimate.cost)
+        if not allowed:
+            return too_many_requests(retry_after)
+        
+        start_date = estimate.start_date
+        es_query = build_search_query(ip_filter, event_filter, start_date, end_date)
+        
+        # Archived days are older than every hot index, so archive rows
+        # continue the hot results in the same newest-first order
+        window = archive_window(start_date, end_date)
+        if window:
+            # Archived-but-kept indices are served from the archive only
+            es_query = exclude_indices(es_query, archive.indices())
         
         print(f"📋 ES Query: {es_query}")
         
         # Execute search with pagination
-        from_value = (page - 1) * 50
-        resp = es.search(
+        from_value = (page - 1) * PAGE_SIZE
+        resp = es_breaker.call(
+            es.search,
             index="siem-logs-*",
             query=es_query,
-            size=50,
+            size=PAGE_SIZE,
             from_=from_value,
-            sort=[{"@timestamp": {"order": "desc"}}]
+            sort=[{"@timestamp": {"order": "desc"}}],
+            # Exact hot total is needed to offset into the archive
+            track_total_hits=True if window else None
         )
         
         # Extract logs with proper severity
@@ -267,26 +575,59 @@ def search_logs():
         
         for h in resp["hits"]["hits"]:
             src = h.get("_source", {})
-            event = src.get("event", "")
+            severity, severity_version = severity_of(src)
             logs.append({
                 "timestamp": src.get("timestamp"),
                 "ip": src.get("ip"),
-                "event": event,
-                "severity": get_severity(event),
+                "event": src.get("event", ""),
+                "severity": severity,
+                "severity_version": severity_version,
             })
         
+        archive_total = None
+        if window:
+            archive_total, archived = archive.search(
+                ip_filter, event_filter, window[0], window[1],
+                offset=max(0, from_value - total),
+                limit=PAGE_SIZE - len(logs)
+            )
+            # Archive rows carry no stamp: classify with the current mapping
+            version = get_severity_version()
+            logs += [
+                dict(row, severity=get_severity(row["event"]), severity_version=version)
+                for row in archived
+            ]
+            total += archive_total
+        
         # Calculate pagination
-        total_pages = (total + 49) // 50  # Ceiling division
+        total_pages = (total + PAGE_SIZE - 1) // PAGE_SIZE  # Ceiling division
         
         print(f"✅ Found {total} logs, returning {len(logs)} on page {page}")
         
-        return jsonify({
+        result = {
             "logs": logs,
             "total": total,
             "page": page,
-            "per_page": 50,
+            "per_page": PAGE_SIZE,
             "total_pages": total_pages,
-        }), 200
+        }
+        if archive_total is not None:
+            result["archive_total"] = archive_total
+        if estimate.action == "downgrade":
+            result["downgraded"] = True
+            result["notice"] = estimate.reason
+            result["start_date"] = start_date
+        
+        return json_response(dumps(result))
+        
+    except CircuitOpenError as e:
+        print(f"❌ Search rejected: {e}")
+        return jsonify({
+            "error": str(e),
+            "logs": [],
+            "total": 0,
+            "page": 1
+        }), 503
         
     except Exception as e:
         print(f"❌ Search error: {e}")
@@ -301,50 +642,166 @@ def search_logs():
 
 
 
+def iter_hot_logs(es_query, batch_size=1000):
+    """
+    Every hot log matching es_query, newest first, paged with a point in time
+    """
+    pit_id = es_breaker.call(es.open_point_in_time, index="siem-logs-*", keep_alive="1m")["id"]
+    try:
+        search_after = None
+        while True:
+            resp = es_breaker.call(
+                es.search,
+                pit={"id": pit_id, "keep_alive": "1m"},
+                query=es_query,
+                size=batch_size,
+                sort=[{"@timestamp": {"order": "desc"}}],
+                search_after=search_after,
+                # Stored severity stamps, so export matches /api/logs/search
+                source=["timestamp", "ip", "event", "severity", "severity_version"]
+            )
+            hits = resp["hits"]["hits"]
+            if not hits:
+                return
+            for h in hits:
+                yield h.get("_source", {})
+            search_after = hits[-1]["sort"]
+            pit_id = resp.get("pit_id", pit_id)
+    finally:
+        try:
+            es.close_point_in_time(id=pit_id)
+        except Exception as e:
+            print(f"Error closing point in time: {e}")
+
+
+
+@app.route('/api/logs/export', methods=['GET'])
+def export_logs():
+    """
+    Export logs matching the /api/logs/search filters as CSV, newest first
+    Hot indices first, then the cold-tier archive when the range reaches past
+    HOT_RETENTION_DAYS; capped at EXPORT_MAX_ROWS rows
+    """
+    ip_filter = request.args.get('ip', '').strip()
+    event_filter = request.args.get('event', '').strip()
+    start_date = request.args.get('start_date', '').strip()
+    end_date = request.args.get('end_date', '').strip()
+    
+    estimate = estimate_search_cost(ip_filter, event_filter, start_date, end_date)
+    if estimate.action == "reject":
+        return jsonify({"error": estimate.reason}), 400
+    
+    allowed, retry_after = search_limiter.consume(client_id(), estimate.cost)
+    if not allowed:
+        return too_many_requests(retry_after)
+    
+    # Rows stream after the headers are sent, so refuse up front while ES is down
+    if es_breaker.status()["state"] == "open":
+        return jsonify({"error": "elasticsearch unavailable (circuit open)"}), 503
+    
+    start_date = estimate.start_date
+    es_query = build_search_query(ip_filter, event_filter, start_date, end_date)
+    window = archive_window(start_date, end_date)
+    if window:
+        es_query = exclude_indices(es_query, archive.indices())
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        def line(row):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+            return buffer.getvalue()
+        
+        yield line(["timestamp", "ip", "event", "severity", "severity_version"])
+        rows = iter_hot_logs(es_query)
+        if window:
+            rows = itertools.chain(rows, archive.iter_rows(ip_filter, event_filter, window[0], window[1]))
+        
+        for src in itertools.islice(rows, Config.EXPORT_MAX_ROWS):
+            severity, severity_version = severity_of(src)
+            yield line([src.get("timestamp"), src.get("ip"), src.get("event") or "", severity, severity_version])
+    
+    print(f"📤 Export - IP: {ip_filter}, Event: {event_filter}, Start: {start_date}, End: {end_date}, Archive: {bool(window)}")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={"Content-Disposition": "attachment; filename=siem-logs.csv"}
+    )
+
+
+
+@app.route('/api/logs/anomalies', methods=['GET'])
+def get_anomalies():
+    """
+    Top-K most anomalous events of a time window, as scored against per-IP and
+    per-event behavioral baselines by anomaly_worker.py
+    Reads the per-minute outlier sets from Redis, no ES aggregation involved
+    Query params:
+    - minutes: window length (default 60, max 1440)
+    - end: ISO 8601 end of the window (default now)
+    - k: number of events (default 20, max ANOMALY_KEEP_PER_MINUTE)
+    """
+    minutes = min(max(1, request.args.get('minutes', 60, type=int)), 1440)
+    k = min(max(1, request.args.get('k', 20, type=int)), Config.ANOMALY_KEEP_PER_MINUTE)
+    end_param = request.args.get('end', '')
+    end = parse_date(end_param) if end_param else datetime.now(timezone.utc)
+    if end is None:
+        return jsonify({"error": "end must be an ISO 8601 date"}), 400
+    
+    end_minute = int(end.timestamp()) // 60
+    keys = [outlier_key(minute) for minute in range(end_minute - minutes + 1, end_minute + 1)]
+    ranked = cache.top_ranked(keys, k)
+    if ranked is None:
+        return jsonify({"error": "Anomaly scores are temporarily unavailable"}), 503
+    
+    anomalies = []
+    version = get_severity_version()
+    for member, score in ranked:
+        row = loads(member)
+        row["score"] = score
+        row["severity"] = get_severity(row.get("event") or "")
+        row["severity_version"] = version
+        anomalies.append(row)
+    
+    return jsonify({
+        "anomalies": anomalies,
+        "count": len(anomalies),
+        "window": {
+            "start": datetime.fromtimestamp((end_minute - minutes + 1) * 60, timezone.utc).isoformat(),
+            "end": end.isoformat()
+        }
+    }), 200
+
+
+
 @app.route('/api/logs/unique-ips', methods=['GET'])
 def get_unique_ips():
     """
     US-SEARCH-2: Get all unique IP addresses for dropdown
     """
     # Check cache first
-    cached = cache.get_cache("unique_ips")
+    cached = cache.get_body("unique_ips")
     if cached:
         print("✅ Cache HIT for unique_ips")
-        return jsonify({"ips": cached}), 200
+        return json_response(splice({"ips": cached.body}), etag=cached.etag)
     
     print("⏳ Cache MISS for unique_ips - fetching from ES")
     
     try:
-        resp = es.search(
-            index="siem-logs-*",
-            aggs={
-                "unique_ips": {
-                    "terms": {
-                        "field": "ip.keyword",
-                        "size": 1000
-                    }
-                }
-            },
-            size=0
-        )
+        # Cached for 5 minutes
+        panel = fetch_panel("unique_ips")
         
-        ips = []
-        for bucket in resp["aggregations"]["unique_ips"]["buckets"]:
-            ips.append({
-                "ip": bucket["key"],
-                "count": bucket["doc_count"]
-            })
-        
-        # Sort by count descending
-        ips.sort(key=lambda x: x["count"], reverse=True)
-        
-        # Cache for 5 minutes
-        cache.set_cache("unique_ips", ips, ttl=300)
-        
-        return jsonify({"ips": ips}), 200
+        return json_response(splice({"ips": panel.body}), etag=panel.etag)
         
     except Exception as e:
         print(f"Error fetching unique IPs: {e}")
+        stale = stale_panel("unique_ips")
+        if stale:
+            return json_response(splice({"ips": stale.body, "stale": b"true"}), etag=f"stale-{stale.etag}")
         return jsonify({"ips": [], "error": str(e)}), 500
 
 
@@ -355,46 +812,24 @@ def get_unique_events():
     US-SEARCH-2: Get all unique event types for dropdown
     """
     # Check cache first
-    cached = cache.get_cache("unique_events")
+    cached = cache.get_body("unique_events")
     if cached:
         print("✅ Cache HIT for unique_events")
-        return jsonify({"events": cached}), 200
+        return json_response(splice({"events": cached.body}), etag=cached.etag)
     
     print("⏳ Cache MISS for unique_events - fetching from ES")
     
     try:
-        resp = es.search(
-            index="siem-logs-*",
-            aggs={
-                "unique_events": {
-                    "terms": {
-                        "field": "event.keyword",
-                        "size": 100
-                    }
-                }
-            },
-            size=0
-        )
-        
-        events = []
-        for bucket in resp["aggregations"]["unique_events"]["buckets"]:
-            event_name = bucket["key"]
-            events.append({
-                "event": event_name,
-                "count": bucket["doc_count"],
-                "severity": get_severity(event_name),
-            })
-        
-        # Sort by count descending
-        events.sort(key=lambda x: x["count"], reverse=True)
+        # Cached for 5 minutes
+        panel = fetch_panel("unique_events")
         
-        # Cache for 5 minutes
-        cache.set_cache("unique_events", events, ttl=300)
-        
-        return jsonify({"events": events}), 200
+        return json_response(splice({"events": panel.body}), etag=panel.etag)
         
     except Exception as e:
         print(f"Error fetching unique events: {e}")
+        stale = stale_panel("unique_events")
+        if stale:
+            return json_response(splice({"events": stale.body, "stale": b"true"}), etag=f"stale-{stale.etag}")
         return jsonify({"events": [], "error": str(e)}), 500
 
 
@@ -406,63 +841,31 @@ def get_stats():
     Cache TTL: 60 seconds (stats don't need to be real-time)
     """
     # Check cache first
-    cached = cache.get_cache("stats")
+    cached = cache.get_body("stats")
     if cached:
         print("✅ Cache HIT for stats")
-        return jsonify({**cached, "source": "cache"}), 200
+        body = merge(cached.body, {"source": dumps("cache")})
+        return json_response(body, etag=f"cache-{cached.etag}")
     
     print("⏳ Cache MISS for stats - fetching from ES")
     
     try:
-        # Total logs
-        all_logs = es.search(index="siem-logs-*", size=0)
-        total_logs = all_logs["hits"]["total"]["value"]
+        # One request with every figure as an aggregation, cached for 60 seconds
+        panel = fetch_panel("stats")
         
-        # Failed logins
-        failed_response = es.search(
-            index="siem-logs-*",
-            query={"match": {"event": "login_failed"}},
-            size=0
-        )
-        failed_count = failed_response["hits"]["total"]["value"]
-        
-        # Unique IPs
-        unique_response = es.search(
-            index="siem-logs-*",
-            aggs={"unique_ips": {"cardinality": {"field": "ip.keyword"}}},
-            size=0
-        )
-        unique_ip_count = unique_response["aggregations"]["unique_ips"]["value"]
-        
-        # Critical severity logs
-        critical_response = es.search(
-            index="siem-logs-*",
-            query={
-                "bool": {
-                    "must": [
-                        {"match": {"event": word}}
-                        for word in ["brute_force_attack", "unauthorized_access", "privilege_escalation"]
-                    ]
-                }
-            },
-            size=0
-        )
-        critical_count = critical_response["hits"]["total"]["value"]
-        
-        stats = {
-            "total_logs": total_logs,
-            "failed_logins": failed_count,
-            "unique_ips": unique_ip_count,
-            "critical_events": critical_count,
-            "logs_today": 0
-        }
-        
-        # Cache for 60 seconds
-        cache.set_cache("stats", stats, ttl=60)
-        
-        return jsonify({**stats, "source": "elasticsearch"}), 200
+        body = merge(panel.body, {"source": dumps("elasticsearch")})
+        return json_response(body, etag=f"elasticsearch-{panel.etag}")
         
     except Exception as e:
+        print(f"Error fetching stats: {e}")
+        stale = stale_panel("stats")
+        if stale:
+            body = merge(stale.body, {
+                "source": dumps("stale"),
+                "generated_at": dumps(stale.generated_at)
+            })
+            return json_response(body, etag=f"stale-{stale.etag}")
+        
         return jsonify({
             "total_logs": 0,
             "failed_logins": 0,
@@ -473,6 +876,156 @@ def get_stats():
 
 
 
+# ==================== DASHBOARD ENDPOINTS ====================
+
+
+@app.route('/api/dashboard/snapshot', methods=['GET'])
+def dashboard_snapshot():
+    """
+    Get every dashboard panel in one round trip
+    Warm panels come from a single Redis MGET, cold panels from a single ES msearch
+    Query params:
+    - panels: comma-separated subset of latest_logs, stats, unique_ips, unique_events
+      (default: all)
+    """
+    requested = request.args.get('panels', '').strip()
+    if requested:
+        panels = list(dict.fromkeys(p.strip() for p in requested.split(',') if p.strip()))
+    else:
+        panels = list(DASHBOARD_PANELS)
+    
+    unknown = [p for p in panels if p not in DASHBOARD_PANELS]
+    if unknown:
+        return jsonify({
+            "error": f"Unknown panels: {', '.join(unknown)}",
+            "available": list(DASHBOARD_PANELS)
+        }), 400
+    
+    # Warm path: one MGET for every panel
+    cached = cache.get_bodies(panels)
+    result = {name: (cached[name], "cache") for name in panels if cached[name]}
+    missing = [name for name in panels if name not in result]
+    
+    print(f"📊 Snapshot - cache HIT: {list(result)}, MISS: {missing}")
+    
+    # Cold path: one msearch for every missing panel
+    errors = {}
+    if missing:
+        searches = []
+        for name in missing:
+            searches += [{"index": "siem-logs-*"}, DASHBOARD_PANELS[name]["body"]]
+        
+        try:
+            responses = es_breaker.call(es.msearch, searches=searches)["responses"]
+        except Exception as e:
+            print(f"Error fetching dashboard snapshot: {e}")
+            responses = [{"error": str(e)}] * len(missing)
+        
+        for name, resp in zip(missing, responses):
+            panel = DASHBOARD_PANELS[name]
+            if "error" in resp:
+                errors[name] = str(resp["error"])
+                continue
+            result[name] = (cache_panel(name, panel["parse"](resp), ttl=panel["ttl"]), "elasticsearch")
+    
+    # Failed panels fall back to their last good value (one more MGET)
+    if errors:
+        stale = cache.get_bodies([f"{name}:stale" for name in errors])
+        for name in list(errors):
+            if stale[f"{name}:stale"]:
+                result[name] = (stale[f"{name}:stale"], "stale")
+                del errors[name]
+    
+    # Splice the encoded panels into the response; the ETag is derived from
+    # the panel ETags and generation times, so the body is never re-hashed
+    entries = {}
+    tags = []
+    for name in panels:
+        if name in errors:
+            entry = dumps({
+                "data": DASHBOARD_PANELS[name]["fallback"],
+                "error": errors[name],
+                "fallback": True,
+            })
+            tags.append(f"{name}:{make_etag(entry)}")
+        else:
+            panel, source = result[name]
+            entry = splice({
+                "data": panel.body,
+                "source": dumps(source),
+                "generated_at": dumps(panel.generated_at),
+            })
+            tags.append(f"{name}:{source}:{panel.etag}:{panel.generated_at}")
+        entries[name] = entry
+    
+    body = splice({"panels": splice(entries)})
+    return json_response(body, etag=make_etag("|".join(tags).encode()))
+
+
+
+# ==================== SEVERITY MAPPING ENDPOINTS ====================
+
+
+@app.route('/api/severity/mapping', methods=['GET'])
+def get_severity_mapping():
+    """
+    Severity mapping version currently in effect on this worker
+    """
+    version, mapping = mapping_store.current()
+    return jsonify({
+        "version": version,
+        "source": mapping_store.source,
+        "mapping": mapping
+    }), 200
+
+
+
+@app.route('/api/severity/mapping', methods=['PUT'])
+def publish_severity_mapping():
+    """
+    Publish a new mapping version (SEVERITY_MAPPING_SOURCE=mongo only)
+    JSON body: {"mapping": {"event": "low|medium|high|critical", ...}}
+    Other workers pick it up within SEVERITY_RELOAD_SECONDS, and
+    reclassify.py re-stamps stored logs whose severity changed
+    """
+    data = request.get_json(silent=True) or {}
+    mapping = data.get('mapping')
+    valid = {"low", "medium", "high", "critical"}
+    if not isinstance(mapping, dict) or not mapping or not all(v in valid for v in mapping.values()):
+        return jsonify({"error": "mapping must be a non-empty object of event -> low|medium|high|critical"}), 400
+    
+    try:
+        version = mapping_store.publish(mapping)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        print(f"❌ Error publishing severity mapping: {e}")
+        return jsonify({"error": "Could not store the mapping"}), 503
+    
+    print(f"✅ Published severity mapping v{version}")
+    return jsonify({"version": version, "source": mapping_store.source}), 201
+
+
+
+@app.route('/api/severity/reclassify', methods=['GET'])
+def get_reclassify_jobs():
+    """
+    Re-classification jobs per mapping version with their progress
+    """
+    from models.severity_store import ReclassifyJobs
+    
+    jobs = ReclassifyJobs(breaker=mongo_breaker).get_jobs()
+    return jsonify({
+        "current_version": get_severity_version(),
+        "jobs": jobs,
+        "count": len(jobs)
+    }), 200
+
+
+
+# ==================== CACHE ENDPOINTS ====================
+
+
 @app.route('/api/cache/stats', methods=['GET'])
 def cache_stats():
     """
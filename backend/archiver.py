@@ -0,0 +1,111 @@
+"""
+Cold-tier archiver
+Exports daily siem-logs-* indices older than HOT_RETENTION_DAYS into columnar
+archive files (see models/archive.py), then deletes the ES index
+Run periodically (e.g. daily cron): python archiver.py [--dry-run] [--keep-index]
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from elasticsearch import Elasticsearch
+
+from config import Config
+from models.archive import ArchiveStore
+
+
+BATCH_SIZE = 5000
+
+
+def index_day(index_name: str):
+    """
+    siem-logs-YYYY.MM.DD -> date, None for anything else
+    """
+    try:
+        return datetime.strptime(index_name, "siem-logs-%Y.%m.%d").date()
+    except ValueError:
+        return None
+
+
+def archive_index(es, store: ArchiveStore, index_name: str, day) -> dict:
+    """
+    Copy one closed daily index into the archive, in @timestamp order
+    """
+    # The day is over: block writes so the export is a consistent copy
+    es.indices.add_block(index=index_name, block="write")
+    expected = es.count(index=index_name)["count"]
+
+    writer = store.writer(index_name, day, Config.ARCHIVE_ROW_GROUP_SIZE)
+    pit_id = es.open_point_in_time(index=index_name, keep_alive="5m")["id"]
+    try:
+        search_after = None
+        while True:
+            resp = es.search(
+                pit={"id": pit_id, "keep_alive": "5m"},
+                size=BATCH_SIZE,
+                sort=[{"@timestamp": {"order": "asc"}}],
+                search_after=search_after
+            )
+            hits = resp["hits"]["hits"]
+            if not hits:
+                break
+            for h in hits:
+                src = h.get("_source", {})
+                # sort[0] is @timestamp as epoch millis
+                writer.add(h["sort"][0], src.get("timestamp"), src.get("ip"), src.get("event"), src)
+            search_after = hits[-1]["sort"]
+            pit_id = resp.get("pit_id", pit_id)
+        entry = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    finally:
+        es.close_point_in_time(id=pit_id)
+
+    if entry["rows"] != expected:
+        raise RuntimeError(f"{index_name}: archived {entry['rows']} rows, expected {expected}")
+
+    store.add_to_catalog(entry)
+    return entry
+
+
+def run(es, store: ArchiveStore, dry_run: bool = False, keep_index: bool = False):
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=Config.HOT_RETENTION_DAYS)
+
+    for index_name in sorted(es.indices.get(index="siem-logs-*")):
+        day = index_day(index_name)
+        if day is None or day >= cutoff:
+            continue
+
+        if dry_run:
+            print(f"📦 Would archive {index_name}")
+            continue
+
+        if store.has_index(index_name):
+            # Archived by an earlier run that stopped before deleting the index
+            print(f"⏭️  {index_name} already archived")
+        else:
+            try:
+                entry = archive_index(es, store, index_name, day)
+            except Exception as e:
+                print(f"❌ Failed to archive {index_name}: {e}")
+                continue
+            print(f"📦 Archived {index_name}: {entry['rows']} rows, {entry['size_bytes']} bytes")
+
+        if not keep_index:
+            es.indices.delete(index=index_name)
+            print(f"🗑️  Deleted ES index {index_name}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Archive old siem-logs-* indices to the cold tier")
+    parser.add_argument("--dry-run", action="store_true", help="only list indices that would be archived")
+    parser.add_argument("--keep-index", action="store_true", help="archive without deleting the ES index")
+    args = parser.parse_args()
+
+    run(
+        Elasticsearch(['http://localhost:9200']),
+        ArchiveStore(Config.ARCHIVE_ROOT),
+        dry_run=args.dry_run,
+        keep_index=args.keep_index
+    )
@@ -8,3 +8,58 @@ class Config:
     MONGO_URI = os.environ.get('MONGO_URI') or 'mongodb://mongodb:27017/siem'
     ES_HOSTS = os.environ.get('ES_HOSTS') or ['http://elasticsearch:9200']
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://redis:6379'
+
+    # Dependency guards (circuit breakers, rate limits, search admission)
+    BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+    BREAKER_RESET_SECONDS = int(os.environ.get('BREAKER_RESET_SECONDS', 30))
+    STALE_CACHE_TTL = int(os.environ.get('STALE_CACHE_TTL', 86400))
+    RATE_LIMIT_CAPACITY = float(os.environ.get('RATE_LIMIT_CAPACITY', 60))
+    RATE_LIMIT_REFILL_PER_SEC = float(os.environ.get('RATE_LIMIT_REFILL_PER_SEC', 10))
+    SEARCH_BUDGET_CAPACITY = float(os.environ.get('SEARCH_BUDGET_CAPACITY', 30))
+    SEARCH_BUDGET_REFILL_PER_SEC = float(os.environ.get('SEARCH_BUDGET_REFILL_PER_SEC', 0.5))
+    SEARCH_DEFAULT_WINDOW_DAYS = int(os.environ.get('SEARCH_DEFAULT_WINDOW_DAYS', 7))
+    SEARCH_MAX_RANGE_DAYS = int(os.environ.get('SEARCH_MAX_RANGE_DAYS', 90))
+    # Reverse proxies in front of the API (0: clients connect directly)
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+
+    # Saved search scheduler
+    ALERT_TICK_SECONDS = int(os.environ.get('ALERT_TICK_SECONDS', 60))
+    # Watermark field: "ingested_at" (set by Logstash) also catches late/backfilled logs,
+    # "@timestamp" works for pipelines that do not stamp ingest time
+    ALERT_WATERMARK_FIELD = os.environ.get('ALERT_WATERMARK_FIELD', 'ingested_at')
+    # Only evaluate up to now - lag, so documents still being refreshed are not skipped
+    ALERT_INGEST_LAG_SECONDS = int(os.environ.get('ALERT_INGEST_LAG_SECONDS', 30))
+    ALERT_MSEARCH_BATCH = int(os.environ.get('ALERT_MSEARCH_BATCH', 200))
+    ALERT_SAMPLE_SIZE = int(os.environ.get('ALERT_SAMPLE_SIZE', 3))
+
+    # Cold-tier archive (archiver.py)
+    HOT_RETENTION_DAYS = int(os.environ.get('HOT_RETENTION_DAYS', 30))
+    ARCHIVE_ROOT = os.environ.get('ARCHIVE_ROOT') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive')
+    ARCHIVE_ROW_GROUP_SIZE = int(os.environ.get('ARCHIVE_ROW_GROUP_SIZE', 65536))
+    EXPORT_MAX_ROWS = int(os.environ.get('EXPORT_MAX_ROWS', 100000))
+
+    # Severity mapping: "builtin", "file" (SEVERITY_MAPPING_FILE) or "mongo"
+    SEVERITY_MAPPING_SOURCE = os.environ.get('SEVERITY_MAPPING_SOURCE', 'builtin')
+    SEVERITY_MAPPING_FILE = os.environ.get('SEVERITY_MAPPING_FILE') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'severity_mapping.json')
+    SEVERITY_RELOAD_SECONDS = int(os.environ.get('SEVERITY_RELOAD_SECONDS', 30))
+    RECLASSIFY_REQUESTS_PER_SECOND = float(os.environ.get('RECLASSIFY_REQUESTS_PER_SECOND', 500))
+    RECLASSIFY_POLL_SECONDS = int(os.environ.get('RECLASSIFY_POLL_SECONDS', 10))
+    RECLASSIFY_MAX_ATTEMPTS = int(os.environ.get('RECLASSIFY_MAX_ATTEMPTS', 3))
+
+    # Behavioral baselines / anomaly scoring (anomaly_worker.py)
+    ANOMALY_TICK_SECONDS = int(os.environ.get('ANOMALY_TICK_SECONDS', 30))
+    ANOMALY_WATERMARK_FIELD = os.environ.get('ANOMALY_WATERMARK_FIELD', 'ingested_at')
+    ANOMALY_INGEST_LAG_SECONDS = int(os.environ.get('ANOMALY_INGEST_LAG_SECONDS', 30))
+    # First start without a snapshot: warm the baselines on this much history
+    ANOMALY_BOOTSTRAP_HOURS = int(os.environ.get('ANOMALY_BOOTSTRAP_HOURS', 24))
+    ANOMALY_SHORT_HALF_LIFE_SECONDS = int(os.environ.get('ANOMALY_SHORT_HALF_LIFE_SECONDS', 300))
+    ANOMALY_LONG_HALF_LIFE_SECONDS = int(os.environ.get('ANOMALY_LONG_HALF_LIFE_SECONDS', 6 * 3600))
+    ANOMALY_PROFILE_HALF_LIFE_SECONDS = int(os.environ.get('ANOMALY_PROFILE_HALF_LIFE_SECONDS', 7 * 86400))
+    ANOMALY_MAX_ENTITIES = int(os.environ.get('ANOMALY_MAX_ENTITIES', 50000))
+    ANOMALY_IDLE_SECONDS = int(os.environ.get('ANOMALY_IDLE_SECONDS', 3 * 86400))
+    # Events this far behind the stream (old backfills) are neither scored nor learned
+    ANOMALY_MAX_EVENT_AGE_SECONDS = int(os.environ.get('ANOMALY_MAX_EVENT_AGE_SECONDS', 86400))
+    ANOMALY_MIN_SCORE = float(os.environ.get('ANOMALY_MIN_SCORE', 6))
+    ANOMALY_KEEP_PER_MINUTE = int(os.environ.get('ANOMALY_KEEP_PER_MINUTE', 100))
+    ANOMALY_RETENTION_SECONDS = int(os.environ.get('ANOMALY_RETENTION_SECONDS', 7 * 86400))
+    ANOMALY_SNAPSHOT_SECONDS = int(os.environ.get('ANOMALY_SNAPSHOT_SECONDS', 300))
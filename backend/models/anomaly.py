@@ -0,0 +1,296 @@
+import array
+import base64
+import hashlib
+import math
+import struct
+import zlib
+from collections import OrderedDict
+
+from responses import dumps, loads
+
+# Scores are in bits of surprise: each component is log2 of how much less likely
+# the event was than its baseline predicted, so components add up and a score
+# of 10 means roughly "1 in 1000" under the entity's own history.
+# All counters are exponentially decayed: value * 2^(-dt / half_life), applied
+# lazily when an entity is touched, so updates cost O(1) however long it idled.
+SNAPSHOT_FORMAT = 1
+HOURS = 24
+# Decayed events an entity needs before its rate / time-of-day are trusted
+WARMUP_EVENTS = 20.0
+# Pseudo-count pulling an IP's event mix towards the global one
+MIX_PRIOR = 5.0
+
+
+def decay(value: float, dt: float, half_life: float) -> float:
+    return value * 2.0 ** (-dt / half_life) if dt > 0 else value
+
+
+class CountMinSketch:
+    """
+    Decayed count-min sketch of (ip, event) pairs
+    Cells hold counts scaled by 2^((t - origin) / half_life), so decaying the
+    whole sketch is a single division at read time instead of a pass over it;
+    the cells are renormalized once the scale grows large
+    """
+    
+    RENORMALIZE_EXPONENT = 60
+    
+    def __init__(self, width: int = 4096, depth: int = 4, half_life: float = 21600,
+                 origin: float = 0.0, cells: bytes = None):
+        self.width = width
+        self.depth = depth
+        self.half_life = half_life
+        self.origin = origin
+        self.cells = array.array("d")
+        if cells:
+            self.cells.frombytes(cells)
+        else:
+            self.cells.extend([0.0] * (width * depth))
+    
+    def _positions(self, key: str):
+        # Double hashing, one cell per row
+        h1, h2 = struct.unpack("<QQ", hashlib.blake2b(key.encode(), digest_size=16).digest())
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+    
+    def _decay(self, now: float) -> float:
+        # Underflows to 0.0 rather than overflowing after a long gap
+        return 2.0 ** (-(now - self.origin) / self.half_life)
+    
+    def add(self, key: str, now: float, count: float = 1.0):
+        if (now - self.origin) / self.half_life > self.RENORMALIZE_EXPONENT:
+            factor = self._decay(now)
+            for i in range(len(self.cells)):
+                self.cells[i] *= factor
+            self.origin = now
+        weight = count / self._decay(now)
+        for pos in self._positions(key):
+            self.cells[pos] += weight
+    
+    def estimate(self, key: str, now: float) -> float:
+        return min(self.cells[pos] for pos in self._positions(key)) * self._decay(now)
+    
+    def to_dict(self) -> dict:
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "half_life": self.half_life,
+            "origin": self.origin,
+            "cells": base64.b64encode(self.cells.tobytes()).decode()
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["width"], data["depth"], data["half_life"], data["origin"],
+                   base64.b64decode(data["cells"]))
+
+
+class Baseline:
+    """
+    Streaming baseline of one entity (an IP or an event type)
+    short/long: decayed event counts, whose ratio is the current burst factor
+    hours: decayed count per hour of day, the entity's time-of-day profile
+    """
+    
+    __slots__ = ("first_seen", "last_seen", "short", "long", "hours")
+    
+    def __init__(self, first_seen: float = 0.0, last_seen: float = 0.0, short: float = 0.0,
+                 long: float = 0.0, hours=None):
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.short = short
+        self.long = long
+        self.hours = hours or [0.0] * HOURS
+    
+    def advance(self, now: float, short_half_life: float, long_half_life: float, profile_half_life: float):
+        dt = now - self.last_seen
+        if dt > 0:
+            self.short = decay(self.short, dt, short_half_life)
+            self.long = decay(self.long, dt, long_half_life)
+            factor = 2.0 ** (-dt / profile_half_life)
+            self.hours = [count * factor for count in self.hours]
+            self.last_seen = now
+    
+    def burst(self, short_half_life: float, long_half_life: float) -> float:
+        """
+        log2 of the short-term rate over the long-term one (0 while warming up)
+        At a steady rate r the counters settle at r * half_life / ln 2, so the
+        long counter scaled by the half-life ratio is the expected short count;
+        the long counter needs one half-life of history before it gets there
+        """
+        if self.long < WARMUP_EVENTS or self.last_seen - self.first_seen < long_half_life:
+            return 0.0
+        expected = self.long * short_half_life / long_half_life
+        return max(0.0, math.log2((self.short + 1) / (expected + 1)))
+    
+    def off_hours(self, hour: int) -> float:
+        """
+        Surprise of activity at this hour versus a uniform day (0 while warming up)
+        """
+        total = sum(self.hours)
+        if total < WARMUP_EVENTS:
+            return 0.0
+        share = (self.hours[hour] + 1) / (total + HOURS)
+        return max(0.0, -math.log2(share * HOURS))
+    
+    def add(self, hour: int):
+        self.short += 1
+        self.long += 1
+        self.hours[hour] += 1
+    
+    def to_list(self) -> list:
+        return [self.first_seen, self.last_seen, self.short, self.long] + self.hours
+    
+    @classmethod
+    def from_list(cls, values: list):
+        return cls(values[0], values[1], values[2], values[3], list(values[4:]))
+
+
+class AnomalyDetector:
+    """
+    Incremental per-IP and per-event behavioral baselines
+    score() rates an event against the baselines, then learns it: O(1) work
+    per event (two table lookups, d sketch cells, 24 profile buckets)
+    Memory is bounded: each table is an LRU capped at max_entities, and
+    entities idle for idle_seconds are evicted by evict_idle()
+    Time is the largest event time seen, so the detector replays the same
+    way from a snapshot whatever the wall clock says
+    """
+    
+    def __init__(self, short_half_life: float = 300, long_half_life: float = 21600,
+                 profile_half_life: float = 604800, max_entities: int = 50000,
+                 idle_seconds: float = 259200, max_event_age: float = 86400):
+        self.short_half_life = short_half_life
+        self.long_half_life = long_half_life
+        self.profile_half_life = profile_half_life
+        self.max_entities = max_entities
+        self.idle_seconds = idle_seconds
+        self.max_event_age = max_event_age
+        self.clock = 0.0
+        self.total = 0.0
+        self.total_at = 0.0
+        self.ips = OrderedDict()
+        self.events = OrderedDict()
+        self.mix = CountMinSketch(half_life=long_half_life)
+        self.evicted = 0
+    
+    def _touch(self, table: OrderedDict, key: str) -> Baseline:
+        baseline = table.get(key)
+        if baseline is None:
+            baseline = table[key] = Baseline(first_seen=self.clock, last_seen=self.clock)
+            if len(table) > self.max_entities:
+                table.popitem(last=False)
+                self.evicted += 1
+        else:
+            table.move_to_end(key)
+        baseline.advance(self.clock, self.short_half_life, self.long_half_life, self.profile_half_life)
+        return baseline
+    
+    def score(self, ts_ms: int, ip: str, event: str):
+        """
+        Score one event and fold it into the baselines
+        ts_ms must not be in the future (callers cap it at ingest time): the
+        clock never moves back, so one future-dated event would make every
+        real event look too old to score
+        Returns {"score": bits, "components": {...}}, or None for events too
+        far behind the stream to be compared with the current baselines
+        """
+        ts = ts_ms / 1000.0
+        if ts < self.clock - self.max_event_age:
+            return None
+        self.clock = max(self.clock, ts)
+        hour = int(ts // 3600) % HOURS
+        ip = ip or "-"
+        event = event or "-"
+        
+        self.total = decay(self.total, self.clock - self.total_at, self.long_half_life)
+        self.total_at = self.clock
+        ip_baseline = self._touch(self.ips, ip)
+        event_baseline = self._touch(self.events, event)
+        pair = f"{ip}\x1f{event}"
+        
+        # How usual is this event type for this IP, smoothed towards how
+        # usual it is overall (so a new IP is judged by the global mix)
+        global_share = (event_baseline.long + 1) / (self.total + len(self.events))
+        seen = min(self.mix.estimate(pair, self.clock), ip_baseline.long)
+        mix_share = (seen + MIX_PRIOR * global_share) / (ip_baseline.long + MIX_PRIOR)
+        
+        components = {
+            "ip_burst": ip_baseline.burst(self.short_half_life, self.long_half_life),
+            "event_burst": event_baseline.burst(self.short_half_life, self.long_half_life),
+            "off_hours": ip_baseline.off_hours(hour),
+            "rare_event": max(0.0, -math.log2(mix_share))
+        }
+        
+        ip_baseline.add(hour)
+        event_baseline.add(hour)
+        self.mix.add(pair, self.clock)
+        self.total += 1
+        
+        return {
+            "score": round(sum(components.values()), 3),
+            "components": {name: round(value, 3) for name, value in components.items()}
+        }
+    
+    def evict_idle(self) -> int:
+        """
+        Drop entities not seen for idle_seconds
+        Tables are in last-seen order, so this stops at the first active one
+        """
+        cutoff = self.clock - self.idle_seconds
+        evicted = 0
+        for table in (self.ips, self.events):
+            while table and next(iter(table.values())).last_seen < cutoff:
+                table.popitem(last=False)
+                evicted += 1
+        self.evicted += evicted
+        return evicted
+    
+    def stats(self) -> dict:
+        return {
+            "clock": self.clock,
+            "ips": len(self.ips),
+            "events": len(self.events),
+            "evicted": self.evicted
+        }
+    
+    def to_snapshot(self, watermark_ms: int) -> bytes:
+        """
+        Compressed state plus the watermark it is consistent with
+        """
+        state = {
+            "format": SNAPSHOT_FORMAT,
+            "watermark_ms": watermark_ms,
+            "clock": self.clock,
+            "total": self.total,
+            "total_at": self.total_at,
+            "evicted": self.evicted,
+            "mix": self.mix.to_dict(),
+            # Lists keep LRU order, so eviction resumes where it left off
+            "ips": [[key] + baseline.to_list() for key, baseline in self.ips.items()],
+            "events": [[key] + baseline.to_list() for key, baseline in self.events.items()]
+        }
+        return zlib.compress(dumps(state), 6)
+    
+    def restore(self, snapshot: bytes):
+        """
+        Load state from to_snapshot()
+        Returns the watermark to resume from, None if the snapshot is unusable
+        """
+        state = loads(zlib.decompress(snapshot))
+        if state.get("format") != SNAPSHOT_FORMAT:
+            return None
+        self.clock = state["clock"]
+        self.total = state["total"]
+        self.total_at = state["total_at"]
+        self.evicted = state["evicted"]
+        self.mix = CountMinSketch.from_dict(state["mix"])
+        self.ips = OrderedDict((row[0], Baseline.from_list(row[1:])) for row in state["ips"])
+        self.events = OrderedDict((row[0], Baseline.from_list(row[1:])) for row in state["events"])
+        return state["watermark_ms"]
+
+
+def outlier_key(minute: int) -> str:
+    """
+    Redis sorted set holding the top outliers of one minute (epoch minutes)
+    """
+    return f"anomalies:{minute}"
@@ -0,0 +1,380 @@
+import array
+import base64
+import bisect
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import zlib
+from itertools import accumulate
+
+# File layout:
+#   MAGIC | row group column blocks (zlib) ... | footer JSON | footer length (u64) | MAGIC
+# Rows are sorted by @timestamp; each row group records its min/max timestamp and the
+# offset/length of every column block, so scans only decompress the blocks they need.
+# Columns: ts (@timestamp epoch ms, delta-encoded int64), timestamp (raw string),
+# ip/event (sorted dictionary as a JSON array + uint32 codes), _source (JSON lines,
+# for export/restore). Footer format 1 files stored dictionaries newline-joined.
+MAGIC = b"SIEMCOL1"
+FORMAT = 2
+FOOTER_LENGTH = struct.Struct("<Q")
+CATALOG_FILE = "catalog.json"
+
+
+class BloomFilter:
+    """
+    Fixed-size bloom filter, stored base64-encoded in the archive catalog
+    """
+    
+    def __init__(self, size_bits: int, num_hashes: int, bits: bytes = None):
+        self.size_bits = max(8, size_bits)
+        self.num_hashes = max(1, num_hashes)
+        self.bits = bytearray(bits) if bits else bytearray((self.size_bits + 7) // 8)
+    
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        size_bits = int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        num_hashes = round(size_bits / capacity * math.log(2))
+        return cls(size_bits, num_hashes)
+    
+    def _positions(self, value: str):
+        # Double hashing: h1 + i * h2
+        h1, h2 = struct.unpack("<QQ", hashlib.blake2b(value.encode(), digest_size=16).digest())
+        return [(h1 + i * h2) % self.size_bits for i in range(self.num_hashes)]
+    
+    def add(self, value: str):
+        for pos in self._positions(value):
+            self.bits[pos // 8] |= 1 << (pos % 8)
+    
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(value))
+    
+    def to_dict(self) -> dict:
+        return {
+            "size_bits": self.size_bits,
+            "num_hashes": self.num_hashes,
+            "bits": base64.b64encode(bytes(self.bits)).decode()
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["size_bits"], data["num_hashes"], base64.b64decode(data["bits"]))
+
+
+class ArchiveWriter:
+    """
+    Streams rows, already sorted by @timestamp, into a columnar archive file
+    The file only appears under its final name once close() succeeds
+    """
+    
+    def __init__(self, path: str, index_name: str, row_group_size: int = 65536):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.index_name = index_name
+        self.row_group_size = row_group_size
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(self.tmp_path, "wb")
+        self._file.write(MAGIC)
+        self._rows = []
+        self._row_groups = []
+        self._ips = set()
+        self._events = set()
+        self.total_rows = 0
+    
+    def add(self, ts_ms: int, timestamp: str, ip: str, event: str, source: dict):
+        self._rows.append((ts_ms, timestamp or "", ip or "", event or "", source))
+        if len(self._rows) >= self.row_group_size:
+            self._flush_group()
+    
+    def _write_block(self, data: bytes) -> list:
+        compressed = zlib.compress(data, 6)
+        offset = self._file.tell()
+        self._file.write(compressed)
+        return [offset, len(compressed)]
+    
+    def _write_dictionary(self, values: list) -> tuple:
+        dictionary = sorted(set(values))
+        codes = {value: code for code, value in enumerate(dictionary)}
+        return (
+            # JSON, not newline-joined: values may contain newlines
+            self._write_block(json.dumps(dictionary).encode()),
+            self._write_block(array.array("I", (codes[v] for v in values)).tobytes())
+        )
+    
+    def _flush_group(self):
+        if not self._rows:
+            return
+        
+        rows = sorted(self._rows, key=lambda row: row[0])
+        ts = [row[0] for row in rows]
+        if self._row_groups and ts[0] < self._row_groups[-1]["max_ts"]:
+            raise ValueError("Archive rows must be added in @timestamp order")
+        
+        ips = [row[2] for row in rows]
+        events = [row[3] for row in rows]
+        self._ips.update(ips)
+        self._events.update(events)
+        
+        deltas = array.array("q", [ts[0]] + [b - a for a, b in zip(ts, ts[1:])])
+        ip_dict, ip_codes = self._write_dictionary(ips)
+        event_dict, event_codes = self._write_dictionary(events)
+        self._row_groups.append({
+            "rows": len(rows),
+            "min_ts": ts[0],
+            "max_ts": ts[-1],
+            "columns": {
+                "ts": self._write_block(deltas.tobytes()),
+                "timestamp": self._write_block("\n".join(row[1].replace("\n", " ") for row in rows).encode()),
+                "ip_dict": ip_dict,
+                "ip": ip_codes,
+                "event_dict": event_dict,
+                "event": event_codes,
+                "_source": self._write_block("\n".join(json.dumps(row[4]) for row in rows).encode())
+            }
+        })
+        self.total_rows += len(rows)
+        self._rows = []
+    
+    def close(self) -> dict:
+        """
+        Finish the file and return its catalog entry (min/max and bloom metadata)
+        """
+        self._flush_group()
+        footer = json.dumps({
+            "format": FORMAT,
+            "index": self.index_name,
+            "rows": self.total_rows,
+            "row_groups": self._row_groups
+        }).encode()
+        self._file.write(footer)
+        self._file.write(FOOTER_LENGTH.pack(len(footer)))
+        self._file.write(MAGIC)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+        
+        ip_bloom = BloomFilter.for_capacity(len(self._ips))
+        for ip in self._ips:
+            ip_bloom.add(ip)
+        event_bloom = BloomFilter.for_capacity(len(self._events))
+        for event in self._events:
+            event_bloom.add(event)
+        
+        return {
+            "index": self.index_name,
+            "path": self.path,
+            "rows": self.total_rows,
+            "min_ts": self._row_groups[0]["min_ts"] if self._row_groups else None,
+            "max_ts": self._row_groups[-1]["max_ts"] if self._row_groups else None,
+            "size_bytes": os.path.getsize(self.path),
+            "ip_bloom": ip_bloom.to_dict(),
+            "event_bloom": event_bloom.to_dict()
+        }
+    
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class ArchiveReader:
+    """
+    Memory-mapped reader for one archive file
+    Only the pages of the column blocks a scan touches are read from disk
+    """
+    
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        tail = len(MAGIC) + FOOTER_LENGTH.size
+        if self._mm[:len(MAGIC)] != MAGIC or self._mm[-len(MAGIC):] != MAGIC:
+            self.close()
+            raise ValueError(f"Not an archive file: {path}")
+        (footer_length,) = FOOTER_LENGTH.unpack(self._mm[-tail:-len(MAGIC)])
+        footer = json.loads(self._mm[-tail - footer_length:-tail])
+        self.row_groups = footer["row_groups"]
+        self.total_rows = footer["rows"]
+        self.format = footer.get("format", 1)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        self._mm.close()
+        self._file.close()
+    
+    def _block(self, group: dict, column: str) -> bytes:
+        offset, length = group["columns"][column]
+        with memoryview(self._mm)[offset:offset + length] as block:
+            return zlib.decompress(block)
+    
+    def _strings(self, group: dict, column: str) -> list:
+        return self._block(group, column).decode().split("\n")
+    
+    def timestamps(self, group: dict) -> array.array:
+        deltas = array.array("q")
+        deltas.frombytes(self._block(group, "ts"))
+        return array.array("q", accumulate(deltas))
+    
+    def codes(self, group: dict, column: str) -> tuple:
+        """
+        (sorted dictionary, per-row codes) for a dictionary-encoded column
+        """
+        codes = array.array("I")
+        codes.frombytes(self._block(group, column))
+        if self.format == 1:
+            return self._strings(group, f"{column}_dict"), codes
+        return json.loads(self._block(group, f"{column}_dict")), codes
+    
+    def scan(self, start_ms: int = None, end_ms: int = None, ip: str = "", event: str = ""):
+        """
+        Yield (row group, matching row positions) newest first, positions descending
+        Pushdown: row groups outside the time range are skipped from footer
+        metadata, the range inside a group is found by bisecting the sorted
+        timestamps, and ip/event are compared as dictionary codes
+        """
+        for group in reversed(self.row_groups):
+            if start_ms is not None and group["max_ts"] < start_ms:
+                break  # every older group is out of range too
+            if end_ms is not None and group["min_ts"] > end_ms:
+                continue
+            
+            ts = self.timestamps(group)
+            lo = bisect.bisect_left(ts, start_ms) if start_ms is not None else 0
+            hi = bisect.bisect_right(ts, end_ms) if end_ms is not None else len(ts)
+            positions = range(lo, hi)
+            
+            for column, value in (("ip", ip), ("event", event)):
+                if not value or not positions:
+                    continue
+                dictionary, codes = self.codes(group, column)
+                code = bisect.bisect_left(dictionary, value)
+                if code == len(dictionary) or dictionary[code] != value:
+                    positions = []
+                    break
+                positions = [i for i in positions if codes[i] == code]
+            
+            if positions:
+                yield group, list(reversed(positions))
+    
+    def rows(self, group: dict, positions: list) -> list:
+        """
+        Materialize log rows for the given positions of a row group
+        """
+        timestamps = self._strings(group, "timestamp")
+        ip_dict, ip_codes = self.codes(group, "ip")
+        event_dict, event_codes = self.codes(group, "event")
+        return [
+            {
+                "timestamp": timestamps[i] or None,
+                "ip": ip_dict[ip_codes[i]] or None,
+                "event": event_dict[event_codes[i]]
+            }
+            for i in positions
+        ]
+
+
+class ArchiveStore:
+    """
+    Cold tier: time-partitioned archive files plus a catalog of their
+    min/max timestamps and ip/event bloom filters
+    <root>/<YYYY>/<MM>/<index>.col, <root>/catalog.json
+    """
+    
+    def __init__(self, root: str):
+        self.root = root
+        self.catalog_path = os.path.join(root, CATALOG_FILE)
+        self._catalog = {}
+        self._catalog_mtime = None
+    
+    def path_for(self, index_name: str, day) -> str:
+        return os.path.join(self.root, f"{day:%Y}", f"{day:%m}", f"{index_name}.col")
+    
+    def writer(self, index_name: str, day, row_group_size: int = 65536) -> ArchiveWriter:
+        return ArchiveWriter(self.path_for(index_name, day), index_name, row_group_size)
+    
+    def catalog(self) -> dict:
+        """
+        {index name: catalog entry}, reloaded only when the file changes
+        """
+        try:
+            mtime = os.path.getmtime(self.catalog_path)
+        except OSError:
+            return {}
+        
+        if mtime != self._catalog_mtime:
+            with open(self.catalog_path) as f:
+                self._catalog = json.load(f)
+            self._catalog_mtime = mtime
+        return self._catalog
+    
+    def add_to_catalog(self, entry: dict):
+        catalog = dict(self.catalog())
+        catalog[entry["index"]] = entry
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.catalog_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(catalog, f)
+        os.replace(tmp_path, self.catalog_path)
+    
+    def has_index(self, index_name: str) -> bool:
+        return index_name in self.catalog()
+    
+    def indices(self) -> list:
+        """
+        Names of every archived index, including ones kept in ES (--keep-index)
+        """
+        return list(self.catalog())
+    
+    def _candidates(self, start_ms=None, end_ms=None, ip="", event="") -> list:
+        # File-level pruning from the catalog, newest file first
+        entries = []
+        for entry in self.catalog().values():
+            if not entry["rows"]:
+                continue
+            if start_ms is not None and entry["max_ts"] < start_ms:
+                continue
+            if end_ms is not None and entry["min_ts"] > end_ms:
+                continue
+            if ip and ip not in BloomFilter.from_dict(entry["ip_bloom"]):
+                continue
+            if event and event not in BloomFilter.from_dict(entry["event_bloom"]):
+                continue
+            entries.append(entry)
+        return sorted(entries, key=lambda entry: entry["max_ts"], reverse=True)
+    
+    def search(self, ip: str = "", event: str = "", start_ms: int = None, end_ms: int = None,
+               offset: int = 0, limit: int = 50) -> tuple:
+        """
+        Count matching archived rows and return the [offset, offset + limit)
+        window of them, newest first
+        Returns (total, rows)
+        """
+        total = 0
+        rows = []
+        for entry in self._candidates(start_ms, end_ms, ip, event):
+            with ArchiveReader(entry["path"]) as reader:
+                for group, positions in reader.scan(start_ms, end_ms, ip, event):
+                    # Only materialize the part of the page that falls in this group
+                    lo = max(0, offset - total)
+                    hi = min(len(positions), offset + limit - total)
+                    if lo < hi:
+                        rows += reader.rows(group, positions[lo:hi])
+                    total += len(positions)
+        return total, rows
+    
+    def iter_rows(self, ip: str = "", event: str = "", start_ms: int = None, end_ms: int = None):
+        """
+        Every matching archived row, newest first (for export)
+        """
+        for entry in self._candidates(start_ms, end_ms, ip, event):
+            with ArchiveReader(entry["path"]) as reader:
+                for group, positions in reader.scan(start_ms, end_ms, ip, event):
+                    yield from reader.rows(group, positions)
@@ -1,43 +1,73 @@
 import redis
+from collections import namedtuple
 from datetime import timedelta
+import heapq
+import itertools
 import json
 
+from models.guard import CircuitBreaker
+
+
+# Pre-encoded JSON body plus the strong ETag and timestamp of the write that produced it
+CachedBody = namedtuple("CachedBody", ["body", "etag", "generated_at"])
+
+
 class CacheManager:
     """
     Redis caching layer for frequently accessed data
     Reduces load on Elasticsearch and MongoDB
     """
     
-    def __init__(self, host='localhost', port=6379, db=0):
+    def __init__(self, host='localhost', port=6379, db=0, breaker: CircuitBreaker = None):
+        # Open circuit -> every call returns its "cache unavailable" value immediately
+        self.breaker = breaker or CircuitBreaker("redis")
         try:
             self.redis = redis.Redis(
                 host=host,
                 port=port,
                 db=db,
                 decode_responses=True,
-                socket_connect_timeout=5
+                socket_connect_timeout=5,
+                socket_timeout=2
+            )
+            # Binary client for pre-encoded response bodies
+            self.raw = redis.Redis(
+                host=host,
+                port=port,
+                db=db,
+                decode_responses=False,
+                socket_connect_timeout=5,
+                socket_timeout=2
             )
+            self.token_bucket = self.redis.register_script(self._TOKEN_BUCKET_SCRIPT)
             # Test connection
             self.redis.ping()
             print("✅ Redis connected successfully")
         except Exception as e:
             print(f"❌ Redis connection error: {e}")
             self.redis = None
+            self.raw = None
+            self.token_bucket = None
+    
+    def _available(self) -> bool:
+        return self.redis is not None and self.breaker.allow_request()
     
     def set_cache(self, key: str, value: dict, ttl: int = 300):
         """
         Cache data with TTL (Time To Live)
         Default: 5 minutes (300 seconds)
         """
-        if self.redis is None:
+        if not self._available():
             return False
         
         try:
             # Convert dict to JSON string
             json_value = json.dumps(value)
             self.redis.setex(key, ttl, json_value)
+            self.breaker.record_success()
             return True
         except Exception as e:
+            self.breaker.record_failure()
             print(f"Error caching {key}: {e}")
             return False
     
@@ -46,29 +76,220 @@ class CacheManager:
         Retrieve cached data
         Returns dict or None if not found
         """
-        if self.redis is None:
+        if not self._available():
             return None
         
         try:
             value = self.redis.get(key)
+            self.breaker.record_success()
             if value:
                 return json.loads(value)
             return None
         except Exception as e:
+            self.breaker.record_failure()
             print(f"Error retrieving cache {key}: {e}")
             return None
     
+    def set_body(self, key: str, cached: "CachedBody", ttl: int = 300, stale_ttl: int = None):
+        """
+        Cache a pre-encoded response body with its ETag and generation time
+        Hits are served as raw bytes, with no JSON decode/encode
+        With stale_ttl, a long-lived "<key>:stale" copy is kept as the
+        last good value to serve while the backing store is down
+        """
+        if not self._available():
+            return False
+        
+        try:
+            value = self._pack(cached)
+            pipe = self.raw.pipeline(transaction=False)
+            pipe.setex(key, ttl, value)
+            if stale_ttl:
+                pipe.setex(f"{key}:stale", stale_ttl, value)
+            pipe.execute()
+            self.breaker.record_success()
+            return True
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"Error caching {key}: {e}")
+            return False
+    
+    def get_body(self, key: str):
+        """
+        Retrieve a pre-encoded response body
+        Returns CachedBody or None if not found
+        """
+        return self.get_bodies([key])[key]
+    
+    def get_bodies(self, keys: list) -> dict:
+        """
+        Retrieve several pre-encoded bodies in one MGET round trip
+        Returns {key: CachedBody or None}
+        """
+        if not self._available():
+            return {key: None for key in keys}
+        
+        try:
+            values = self.raw.mget(keys)
+            self.breaker.record_success()
+            return {
+                key: self._unpack(value) if value else None
+                for key, value in zip(keys, values)
+            }
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"Error retrieving cache {keys}: {e}")
+            return {key: None for key in keys}
+    
+    @staticmethod
+    def _pack(cached: "CachedBody") -> bytes:
+        # "<etag>\n<generated_at>\n<body>" - the header is split off without parsing the body
+        return b"\n".join([cached.etag.encode(), cached.generated_at.encode(), cached.body])
+    
+    @staticmethod
+    def _unpack(value: bytes) -> "CachedBody":
+        etag, generated_at, body = value.split(b"\n", 2)
+        return CachedBody(body, etag.decode(), generated_at.decode())
+    
+    # Token bucket refill + take, atomic across API workers; uses the Redis clock
+    # (EVALSHA via register_script, so the script body is only sent once)
+    _TOKEN_BUCKET_SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local refill_rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill_rate)
+    local allowed = 0
+    local retry_after = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    else
+        retry_after = (cost - tokens) / refill_rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+    return {allowed, tostring(retry_after)}
+    """
+    
+    def consume_tokens(self, key: str, capacity: float, refill_rate: float, cost: float = 1):
+        """
+        Take `cost` tokens from the token bucket stored at `key`
+        Returns (allowed, retry_after_seconds) or None if Redis is unavailable
+        """
+        if not self._available():
+            return None
+        
+        try:
+            allowed, retry_after = self.token_bucket(
+                keys=[key], args=[capacity, refill_rate, cost]
+            )
+            self.breaker.record_success()
+            return bool(allowed), float(retry_after)
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"Error consuming tokens {key}: {e}")
+            return None
+    
+    def set_blob(self, key: str, data: bytes, only_if_missing: bool = False):
+        """
+        Store an opaque binary value with no TTL (e.g. worker state snapshots)
+        only_if_missing: never overwrite an existing value (SET NX)
+        Returns True if stored, False if skipped by only_if_missing,
+        None if Redis is unavailable
+        """
+        if not self._available():
+            return None
+        
+        try:
+            stored = self.raw.set(key, data, nx=only_if_missing)
+            self.breaker.record_success()
+            return bool(stored)
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"Error storing {key}: {e}")
+            return None
+    
+    def get_blob(self, key: str) -> tuple:
+        """
+        Retrieve a binary value stored with set_blob()
+        Returns (available, value): value is None for a missing key, and
+        available is False when Redis could not be asked at all
+        """
+        if not self._available():
+            return False, None
+        
+        try:
+            value = self.raw.get(key)
+            self.breaker.record_success()
+            return True, value
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"Error retrieving {key}: {e}")
+            return False, None
+    
+    def add_ranked(self, entries: dict, keep: int, ttl: int) -> bool:
+        """
+        Add scored members to sorted sets in one pipeline
+        entries: {key: {member: score}}; each set keeps only its `keep`
+        highest-scoring members and expires `ttl` seconds after its last write
+        """
+        if not self._available():
+            return False
+        
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, members in entries.items():
+                pipe.zadd(key, members)
+                pipe.zremrangebyrank(key, 0, -keep - 1)
+                pipe.expire(key, ttl)
+            pipe.execute()
+            self.breaker.record_success()
+            return True
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"Error adding ranked entries: {e}")
+            return False
+    
+    def top_ranked(self, keys: list, k: int):
+        """
+        The k highest-scoring members across several sorted sets, read with
+        one pipelined ZREVRANGE per set
+        Returns [(member, score)] or None if Redis is unavailable
+        """
+        if not self._available():
+            return None
+        
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.zrevrange(key, 0, k - 1, withscores=True)
+            ranked = pipe.execute()
+            self.breaker.record_success()
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"Error retrieving ranked entries: {e}")
+            return None
+        
+        return heapq.nlargest(k, itertools.chain.from_iterable(ranked), key=lambda item: item[1])
+    
     def delete_cache(self, key: str):
         """
         Delete cached data
         """
-        if self.redis is None:
+        if not self._available():
             return False
         
         try:
             self.redis.delete(key)
+            self.breaker.record_success()
             return True
         except Exception as e:
+            self.breaker.record_failure()
             print(f"Error deleting cache {key}: {e}")
             return False
     
@@ -76,13 +297,15 @@ class CacheManager:
         """
         Clear all cache (use with caution)
         """
-        if self.redis is None:
+        if not self._available():
             return False
         
         try:
             self.redis.flushdb()
+            self.breaker.record_success()
             return True
         except Exception as e:
+            self.breaker.record_failure()
             print(f"Error flushing cache: {e}")
             return False
     
@@ -90,13 +313,15 @@ class CacheManager:
         """
         Get info about a cached key
         """
-        if self.redis is None:
+        if not self._available():
             return None
         
         try:
             ttl = self.redis.ttl(key)
             size = self.redis.memory_usage(key)
+            self.breaker.record_success()
             return {"ttl": ttl, "size": size}
         except Exception as e:
+            self.breaker.record_failure()
             print(f"Error getting cache stats: {e}")
             return None
@@ -2,14 +2,19 @@ from pymongo import MongoClient
 from bson import ObjectId
 from datetime import datetime
 from typing import Dict, Any
+from models.guard import CircuitBreaker
 
 class FileMetadata:
     """
     MongoDB model for storing file upload metadata
     """
     
-    def __init__(self):
+    def __init__(self, breaker: CircuitBreaker = None):
         self.collection = None
+        # Skip the 5s connection attempt entirely while MongoDB is known to be down
+        if breaker is not None and not breaker.allow_request():
+            print("❌ MongoDB circuit open, skipping connection")
+            return
         try:
             # MongoDB connection using docker-compose credentials
             client = MongoClient(
@@ -23,9 +28,13 @@ class FileMetadata:
             self.db = client["siem_db"]
             self.collection = self.db["file_uploads"]
             print("✅ MongoDB connected successfully")
+            if breaker is not None:
+                breaker.record_success()
         except Exception as e:
             print(f"❌ MongoDB connection error: {e}")
             self.collection = None
+            if breaker is not None:
+                breaker.record_failure()
     
     def save_upload(self, filename: str, size: int, log_count: int, 
                    status: str = "processed", user_id: str = "system") -> Dict[str, Any]:
@@ -0,0 +1,137 @@
+import threading
+import time
+
+from elasticsearch import ApiError, TransportError
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency whose circuit is open
+    """
+
+
+def is_outage(exc: Exception) -> bool:
+    """
+    Whether an exception means the dependency itself is failing
+    Transport errors, timeouts, ES 5xx and 429 (rejected because ES is
+    saturated) count; a request ES rejects as invalid (other 4xx) is the
+    caller's fault and must not open the circuit
+    """
+    if isinstance(exc, ApiError):
+        return exc.meta.status >= 500 or exc.meta.status == 429
+    return isinstance(exc, (TransportError, ConnectionError, TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Fail fast when a dependency (Elasticsearch, MongoDB, Redis) keeps failing
+    closed -> open after `failure_threshold` consecutive failures
+    open -> half_open after `reset_timeout` seconds, letting one trial call through
+    half_open -> closed if the trial succeeds, back to open if it fails
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: int = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """
+        Whether a call to the dependency may go ahead right now
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"✅ Circuit for {self.name} closed")
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"❌ Circuit for {self.name} opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Run fn through the breaker
+        Raises CircuitOpenError without calling fn while the circuit is open
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} unavailable (circuit open)")
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_outage(e):
+                self.record_failure()
+            else:
+                # The dependency answered: it is healthy even if the call failed
+                self.record_success()
+            raise
+
+        self.record_success()
+        return result
+
+    def status(self) -> dict:
+        with self._lock:
+            retry_in = 0
+            if self.state == "open":
+                retry_in = max(0, round(self.reset_timeout - (time.monotonic() - self.opened_at)))
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "retry_in_seconds": retry_in
+            }
+
+
+class RateLimiter:
+    """
+    Per-client token bucket stored in Redis, shared by every API worker
+    Buckets refill continuously at `refill_rate` tokens/second up to `capacity`
+    """
+
+    def __init__(self, cache, name: str, capacity: float, refill_rate: float):
+        self.cache = cache
+        self.name = name
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+
+    def consume(self, client_id: str, cost: float = 1):
+        """
+        Take `cost` tokens from the client's bucket
+        Returns (allowed, retry_after_seconds)
+        Fails open (allows the request) when Redis is unavailable
+        """
+        result = self.cache.consume_tokens(
+            f"ratelimit:{self.name}:{client_id}",
+            capacity=self.capacity,
+            refill_rate=self.refill_rate,
+            cost=min(cost, self.capacity)
+        )
+        if result is None:
+            return True, 0
+        return result
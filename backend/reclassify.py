@@ -0,0 +1,205 @@
+"""
+Severity re-classification worker
+When the severity mapping version changes, re-stamps `severity` and
+`severity_version` on stored siem-logs-* documents with a sliced, throttled
+update_by_query that only touches event types whose severity changed
+Job state lives in MongoDB (siem_db.severity_jobs), so a restarted worker
+re-attaches to the running ES task or resubmits it
+Run next to the API: python reclassify.py [--once]
+"""
+
+import argparse
+from datetime import datetime
+import time
+
+from elasticsearch import Elasticsearch, NotFoundError
+
+from config import Config
+from models.guard import CircuitBreaker
+from models.severity_store import ReclassifyJobs
+from severity_mapping import changed_severities, classify, mapping_store
+
+
+# params.changes: {event: new severity} precomputed with classify(), so events
+# dropped from the mapping get their keyword-fallback severity. Mirrors the
+# lookup order of classify(): an exact mapping key wins over its lowercase form.
+RECLASSIFY_SCRIPT = """
+String e = ctx._source.event;
+if (e == null) { ctx.op = 'noop'; return; }
+String s = params.changes.get(e);
+if (s == null && !params.exact_keys.contains(e)) { s = params.changes.get(e.toLowerCase()); }
+if (s == null) { ctx.op = 'noop'; return; }
+ctx._source.severity = s;
+ctx._source.severity_version = params.version;
+"""
+
+
+def build_reclassify_query(changed_events: list, version: int) -> dict:
+    """
+    Documents of a changed event type not yet stamped with this version
+    The version filter makes resubmitting a half-finished task idempotent
+    """
+    return {
+        "bool": {
+            "filter": [{
+                "bool": {
+                    "should": [
+                        {"term": {"event.keyword": {"value": event, "case_insensitive": True}}}
+                        for event in changed_events
+                    ],
+                    "minimum_should_match": 1
+                }
+            }],
+            "must_not": [{"term": {"severity_version": version}}]
+        }
+    }
+
+
+def task_progress(status: dict) -> dict:
+    done = sum(status.get(key, 0) for key in ("updated", "noops", "version_conflicts", "deleted"))
+    total = status.get("total", 0)
+    return {
+        "total": total,
+        "updated": status.get("updated", 0),
+        "noops": status.get("noops", 0),
+        "version_conflicts": status.get("version_conflicts", 0),
+        "percent": round(100 * done / total, 1) if total else 100.0
+    }
+
+
+class Reclassifier:
+    """
+    Drives one re-classification job per mapping version
+    """
+
+    def __init__(self, es, jobs: ReclassifyJobs):
+        self.es = es
+        self.jobs = jobs
+
+    def run_once(self):
+        """
+        Start, resume or check the job for the current mapping version
+        Returns the job document
+        """
+        if self.jobs.collection is None:
+            print("❌ MongoDB unavailable, re-classification paused")
+            return None
+
+        version, mapping = mapping_store.current()
+        job = self.jobs.latest()
+
+        if job is None or job["version"] < version:
+            job = self._start_job(version, mapping, superseded=job)
+
+        if job["status"] != "running":
+            return job
+
+        if not job["changed_events"]:
+            self.jobs.update(job["_id"], status="completed", progress=task_progress({}))
+            print(f"✅ Severity mapping v{version}: no severities changed")
+            return job
+
+        if job["task_id"] and not self._check_task(job):
+            return job
+
+        self._submit(job)
+        return job
+
+    def _start_job(self, version: int, mapping: dict, superseded=None):
+        if superseded is None:
+            # No document carries a stamp yet and unstamped ones are classified
+            # with the current mapping when read: record this version as the
+            # baseline instead of re-stamping every mapped event type
+            print(f"✅ Severity mapping v{version}: recorded as baseline, nothing to re-classify")
+            return self.jobs.create(version, mapping, [], status="completed")
+
+        previous = self.jobs.last_completed()
+        changed = set(changed_severities(previous["mapping"] if previous else {}, mapping))
+
+        if superseded["status"] != "completed":
+            # A running, failed or superseded predecessor may have stamped part
+            # of its events already: re-stamp those with the new mapping as well
+            # (a superseded job's events were folded into its successor)
+            if superseded["status"] == "running":
+                if superseded["task_id"]:
+                    try:
+                        self.es.tasks.cancel(task_id=superseded["task_id"])
+                    except NotFoundError:
+                        pass
+                self.jobs.update(superseded["_id"], status="superseded")
+            changed |= set(superseded["changed_events"])
+
+        print(f"🔄 Severity mapping v{version}: re-classifying {len(changed)} event types")
+        return self.jobs.create(version, mapping, sorted(changed))
+
+    def _check_task(self, job) -> bool:
+        """
+        Record progress of the job's ES task
+        Returns True if the task needs to be (re)submitted
+        """
+        try:
+            task = self.es.tasks.get(task_id=job["task_id"])
+        except NotFoundError:
+            # ES restarted and lost the task: resubmit, finished docs are skipped
+            print(f"⚠️  Task {job['task_id']} not found, resubmitting")
+            return True
+
+        progress = task_progress(task["task"]["status"])
+        if not task["completed"]:
+            self.jobs.update(job["_id"], progress=progress)
+            print(f"⏳ Severity mapping v{job['version']}: {progress['percent']}%")
+            return False
+
+        failures = task.get("error") or task.get("response", {}).get("failures")
+        if failures:
+            print(f"❌ Re-classification task failed: {failures}")
+            if job["attempts"] >= Config.RECLASSIFY_MAX_ATTEMPTS:
+                self.jobs.update(job["_id"], status="failed", progress=progress, error=str(failures))
+                return False
+            return True
+
+        self.jobs.update(job["_id"], status="completed", progress=progress, completed_at=datetime.utcnow())
+        print(f"✅ Severity mapping v{job['version']}: {progress['updated']} documents re-classified")
+        return False
+
+    def _submit(self, job):
+        resp = self.es.update_by_query(
+            index="siem-logs-*",
+            query=build_reclassify_query(job["changed_events"], job["version"]),
+            script={
+                "source": RECLASSIFY_SCRIPT,
+                "lang": "painless",
+                "params": {
+                    "changes": {event: classify(event, job["mapping"]) for event in job["changed_events"]},
+                    "exact_keys": list(job["mapping"]),
+                    "version": job["version"]
+                }
+            },
+            slices="auto",
+            requests_per_second=Config.RECLASSIFY_REQUESTS_PER_SECOND,
+            conflicts="proceed",
+            wait_for_completion=False
+        )
+        self.jobs.update(job["_id"], task_id=resp["task"], attempts=job["attempts"] + 1)
+        print(f"🚀 Submitted re-classification task {resp['task']} for v{job['version']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-classify stored severities after a mapping change")
+    parser.add_argument("--once", action="store_true", help="check/advance the job once and exit")
+    args = parser.parse_args()
+
+    mongo_breaker = CircuitBreaker("mongodb", Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_SECONDS)
+    mapping_store.breaker = mongo_breaker
+    reclassifier = Reclassifier(Elasticsearch(['http://localhost:9200']), ReclassifyJobs(breaker=mongo_breaker))
+    while True:
+        # Reconnect if MongoDB was down at startup
+        if reclassifier.jobs.collection is None:
+            reclassifier.jobs = ReclassifyJobs(breaker=mongo_breaker)
+        try:
+            reclassifier.run_once()
+        except Exception as e:
+            print(f"❌ Re-classification check failed: {e}")
+        if args.once:
+            break
+        time.sleep(Config.RECLASSIFY_POLL_SECONDS)
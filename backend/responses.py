@@ -0,0 +1,127 @@
+"""
+Fast JSON responses for the SIEM API
+Pre-encoded bodies, gzip/brotli negotiation and strong ETags
+"""
+
+import gzip
+import hashlib
+import json
+
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+SUPPORTED_ENCODINGS = ["br", "gzip"] if brotli else ["gzip"]
+
+
+def dumps(value) -> bytes:
+    """
+    Encode a value to compact JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def loads(raw):
+    """
+    Decode JSON bytes/str produced by dumps()
+    """
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def make_etag(body: bytes) -> str:
+    """
+    Strong validator for an encoded body
+    """
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def splice(fields: dict) -> bytes:
+    """
+    Build a JSON object from already-encoded values without decoding them
+    e.g. splice({"logs": cached_body, "source": dumps("cache")})
+    """
+    parts = [dumps(key) + b":" + value for key, value in fields.items()]
+    return b"{" + b",".join(parts) + b"}"
+
+
+def merge(obj: bytes, fields: dict) -> bytes:
+    """
+    Add already-encoded fields to an encoded JSON object
+    e.g. merge(cached_stats, {"source": dumps("cache")})
+    """
+    extra = splice(fields)
+    if obj.rstrip() == b"{}":
+        return extra
+    return obj.rstrip()[:-1] + b"," + extra[1:]
+
+
+def negotiate_encoding():
+    """
+    Pick the best compression the client accepts, or None for identity
+    """
+    return request.accept_encodings.best_match(SUPPORTED_ENCODINGS)
+
+
+def _representation_etag(etag: str, encoding) -> str:
+    # Compressed and identity bodies are different representations,
+    # so they need different strong validators
+    return etag if encoding is None else f"{etag}-{encoding}"
+
+
+def not_modified(etag: str):
+    """
+    Return a 304 response if the client already holds this representation,
+    so callers can skip building the body entirely
+    """
+    tag = _representation_etag(etag, negotiate_encoding())
+    if not request.if_none_match.contains(tag):
+        return None
+
+    response = Response(status=304)
+    response.set_etag(tag)
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def json_response(body: bytes, status: int = 200, etag: str = None) -> Response:
+    """
+    Serve pre-encoded JSON with a strong ETag and negotiated compression
+    """
+    if etag is None:
+        etag = make_etag(body)
+
+    if status == 200:
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+    encoding = negotiate_encoding()
+    response = Response(status=status, mimetype="application/json")
+    response.set_etag(_representation_etag(etag, encoding))
+    response.vary.add("Accept-Encoding")
+
+    if encoding is not None and len(body) >= COMPRESS_MIN_BYTES:
+        if encoding == "br":
+            body = brotli.compress(body, quality=4)
+        else:
+            body = gzip.compress(body, compresslevel=6)
+        response.content_encoding = encoding
+
+    response.set_data(body)
+    return response
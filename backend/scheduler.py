@@ -0,0 +1,179 @@
+"""
+Saved search scheduler
+Evaluates due saved searches only over documents newer than their watermark,
+batching every filter group into one msearch per tick, and records alerts
+Run next to the API: python scheduler.py
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import time
+
+from elasticsearch import Elasticsearch
+
+from config import Config
+from models.guard import CircuitBreaker
+from models.saved_search import SavedSearch
+from search_query import build_search_query
+
+
+def epoch_ms(dt: datetime) -> int:
+    """
+    Naive UTC datetime (as stored in Mongo) -> epoch milliseconds
+    """
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def build_group_search(ip: str, event: str, checkpoints: list, upper: datetime) -> dict:
+    """
+    One ES search for every saved search sharing the same filters
+    The query covers (oldest checkpoint, upper]; a keyed range aggregation
+    then gives each distinct checkpoint its own hit count and latest samples
+    """
+    field = Config.ALERT_WATERMARK_FIELD
+    upper_ms = epoch_ms(upper)
+    lower_ms = min(epoch_ms(cp) for cp in checkpoints)
+
+    return {
+        "size": 0,
+        "query": {
+            "bool": {
+                "filter": [
+                    build_search_query(ip, event),
+                    {"range": {field: {"gt": lower_ms, "lte": upper_ms, "format": "epoch_millis"}}}
+                ]
+            }
+        },
+        "aggs": {
+            "since": {
+                "range": {
+                    "field": field,
+                    "keyed": True,
+                    # range agg bounds are [from, to): shift by 1ms for (checkpoint, upper]
+                    "ranges": [
+                        {"key": str(cp_ms), "from": cp_ms + 1, "to": upper_ms + 1}
+                        for cp_ms in sorted({epoch_ms(cp) for cp in checkpoints})
+                    ]
+                },
+                "aggs": {
+                    "latest": {
+                        "top_hits": {
+                            "size": Config.ALERT_SAMPLE_SIZE,
+                            "sort": [{field: {"order": "desc"}}],
+                            "_source": ["timestamp", "ip", "event"]
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+
+class AlertScheduler:
+    """
+    Evaluates saved searches on their schedules
+    A tick costs one msearch per ALERT_MSEARCH_BATCH distinct filter groups,
+    each scanning only the documents since the group's oldest watermark
+    """
+
+    def __init__(self, es, saved_searches: SavedSearch, breaker: CircuitBreaker = None):
+        self.es = es
+        self.saved_searches = saved_searches
+        self.breaker = breaker or CircuitBreaker("elasticsearch")
+
+    def run_tick(self, now: datetime = None) -> dict:
+        now = now or datetime.utcnow()
+        upper = now - timedelta(seconds=Config.ALERT_INGEST_LAG_SECONDS)
+
+        due = self.saved_searches.claim_due(now)
+        if not due:
+            return {"evaluated": 0, "queries": 0, "alerts": 0}
+
+        # Searches created after `upper` have nothing to look at yet
+        groups = defaultdict(list)
+        results = []
+        for search in due:
+            if search["checkpoint"] >= upper:
+                results.append({"search": search, "checkpoint": search["checkpoint"], "hits": 0})
+            else:
+                groups[(search.get("ip", ""), search.get("event", ""))].append(search)
+
+        alerts = []
+        items = list(groups.items())
+        queries = 0
+        for i in range(0, len(items), Config.ALERT_MSEARCH_BATCH):
+            batch = items[i:i + Config.ALERT_MSEARCH_BATCH]
+            searches = []
+            for (ip, event), members in batch:
+                searches += [
+                    {"index": "siem-logs-*", "ignore_unavailable": True},
+                    build_group_search(ip, event, [s["checkpoint"] for s in members], upper)
+                ]
+
+            try:
+                responses = self.breaker.call(self.es.msearch, searches=searches)["responses"]
+                queries += 1
+            except Exception as e:
+                print(f"❌ Saved search evaluation failed: {e}")
+                responses = [{"error": str(e)}] * len(batch)
+
+            for ((ip, event), members), resp in zip(batch, responses):
+                if "error" in resp:
+                    # Keep the old watermark so the next run retries this window
+                    results += [{"search": s, "checkpoint": None, "hits": 0} for s in members]
+                    continue
+
+                buckets = resp["aggregations"]["since"]["buckets"]
+                for search in members:
+                    bucket = buckets[str(epoch_ms(search["checkpoint"]))]
+                    hits = bucket["doc_count"]
+                    results.append({"search": search, "checkpoint": upper, "hits": hits})
+
+                    if hits >= search.get("threshold", 1):
+                        alerts.append({
+                            "_id": SavedSearch.alert_id(search["_id"], epoch_ms(search["checkpoint"])),
+                            "saved_search_id": search["_id"],
+                            "name": search["name"],
+                            "ip": ip,
+                            "event": event,
+                            "hits": hits,
+                            "window_start": search["checkpoint"],
+                            "window_end": upper,
+                            "samples": [h["_source"] for h in bucket["latest"]["hits"]["hits"]],
+                            "user_id": search.get("user_id", "system"),
+                            "created_at": now
+                        })
+
+        if alerts and not self.saved_searches.record_alerts(alerts):
+            # Keep the watermark of every search that alerted, so the window
+            # is evaluated (and its alerts upserted) again next run
+            alerted = {alert["saved_search_id"] for alert in alerts}
+            for result in results:
+                if result["search"]["_id"] in alerted:
+                    result["checkpoint"] = None
+        self.saved_searches.complete(results, now)
+
+        print(f"⏰ Evaluated {len(due)} saved searches in {len(items)} groups "
+              f"with {queries} msearch calls, {len(alerts)} alerts")
+        return {"evaluated": len(due), "queries": queries, "alerts": len(alerts)}
+
+
+if __name__ == '__main__':
+    es = Elasticsearch(['http://localhost:9200'])
+    mongo_breaker = CircuitBreaker("mongodb", Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_SECONDS)
+    es_breaker = CircuitBreaker("elasticsearch", Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_SECONDS)
+    scheduler = AlertScheduler(es, SavedSearch(breaker=mongo_breaker), breaker=es_breaker)
+    indexed = scheduler.saved_searches.ensure_indexes()
+
+    while True:
+        started = time.monotonic()
+        # Reconnect if MongoDB was down at startup
+        if scheduler.saved_searches.collection is None:
+            scheduler.saved_searches = SavedSearch(breaker=mongo_breaker)
+        if not indexed:
+            indexed = scheduler.saved_searches.ensure_indexes()
+        try:
+            scheduler.run_tick()
+        except Exception as e:
+            print(f"❌ Scheduler tick failed: {e}")
+        time.sleep(max(0, Config.ALERT_TICK_SECONDS - (time.monotonic() - started)))
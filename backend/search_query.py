@@ -0,0 +1,218 @@
+"""
+Log search query building and cost estimation
+Shared by /api/logs/search and anything else that runs analyst filters
+"""
+
+import calendar
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import math
+import re
+
+from config import Config
+
+
+PAGE_SIZE = 50
+
+# ES index.max_result_window default: from + size beyond this fails anyway
+MAX_RESULT_WINDOW = 10000
+
+
+# ES date math anchored on now, e.g. "now", "now-1d", "now-2h/h"
+DATE_MATH = re.compile(r"^now([+-]\d+[smhdwMy])*(/[smhdwMy])?$")
+DATE_MATH_OP = re.compile(r"([+-])(\d+)([smhdwMy])|/([smhdwMy])")
+UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+# action: "allow", "downgrade" (run with a narrower range) or "reject"
+SearchCost = namedtuple("SearchCost", ["cost", "action", "reason", "start_date", "end_date"])
+
+
+def build_search_query(ip: str = "", event: str = "", start_date: str = "", end_date: str = "") -> dict:
+    """
+    Build the ES query for the analyst filters (IP, event type, date range)
+    """
+    must_filters = []
+
+    # Add IP filter
+    if ip:
+        must_filters.append({"term": {"ip.keyword": ip}})
+
+    # Add event type filter
+    if event:
+        must_filters.append({"term": {"event.keyword": event}})
+
+    # Add date range filter
+    if start_date or end_date:
+        date_range = {}
+        if start_date:
+            date_range["gte"] = start_date
+        if end_date:
+            date_range["lte"] = end_date
+
+        must_filters.append({
+            "range": {
+                "@timestamp": date_range
+            }
+        })
+
+    if not must_filters:
+        return {"match_all": {}}
+
+    return {
+        "bool": {
+            "must": must_filters
+        }
+    }
+
+
+def parse_date(value: str):
+    """
+    Parse an ISO 8601 date from a query param, None if it is not one
+    (ES date math such as "now-1d" is passed through unparsed, see resolve_date)
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    month = dt.month - 1 + months
+    year = dt.year + month // 12
+    month = month % 12 + 1
+    return dt.replace(year=year, month=month, day=min(dt.day, calendar.monthrange(year, month)[1]))
+
+
+def _round_down(dt: datetime, unit: str) -> datetime:
+    if unit == "w":
+        dt -= timedelta(days=dt.weekday())
+    midnight = {"hour": 0, "minute": 0, "second": 0, "microsecond": 0}
+    if unit == "y":
+        return dt.replace(month=1, day=1, **midnight)
+    if unit == "M":
+        return dt.replace(day=1, **midnight)
+    if unit in ("w", "d"):
+        return dt.replace(**midnight)
+    if unit == "h":
+        return dt.replace(minute=0, second=0, microsecond=0)
+    if unit == "m":
+        return dt.replace(second=0, microsecond=0)
+    return dt.replace(microsecond=0)
+
+
+def _shift(dt: datetime, amount: int, unit: str) -> datetime:
+    if unit in ("M", "y"):
+        return _add_months(dt, amount * (12 if unit == "y" else 1))
+    return dt + timedelta(seconds=amount * UNIT_SECONDS[unit])
+
+
+def resolve_date(value: str, now: datetime = None, round_up: bool = False):
+    """
+    Resolve an ISO 8601 date or now-based ES date math ("now-30d/d") to a
+    datetime the way ES does for a range bound: rounding goes down, or up to
+    the last millisecond of the unit for an upper bound (round_up)
+    None if the value is neither
+    """
+    parsed = parse_date(value)
+    if parsed is not None or not DATE_MATH.match(value):
+        return parsed
+
+    resolved = now or datetime.now(timezone.utc)
+    for sign, amount, unit, rounding in DATE_MATH_OP.findall(value[3:]):
+        if rounding:
+            rounded = _round_down(resolved, rounding)
+            if round_up:
+                rounded = _shift(rounded, 1, rounding) - timedelta(milliseconds=1)
+            resolved = rounded
+        else:
+            resolved = _shift(resolved, int(amount) if sign == "+" else -int(amount), unit)
+    return resolved
+
+
+def estimate_search_cost(ip: str = "", event: str = "", start_date: str = "",
+                         end_date: str = "", page: int = 1) -> SearchCost:
+    """
+    Estimate how expensive a log search is before sending it to ES
+    Cost is in rate-limit tokens: roughly one per week of daily indices scanned,
+    doubled when there is no IP/event term to narrow it, plus deep-paging overhead
+    - dates that are neither ISO 8601 nor now-based ES date math: rejected
+    - no start date: downgraded to the SEARCH_DEFAULT_WINDOW_DAYS days up to
+      end_date (or now)
+    - unfiltered range wider than SEARCH_MAX_RANGE_DAYS: rejected
+    - pages past ES max_result_window: rejected
+    """
+    now = datetime.now(timezone.utc)
+    action, reason = "allow", None
+
+    if (page - 1) * PAGE_SIZE + PAGE_SIZE > MAX_RESULT_WINDOW:
+        return SearchCost(0, "reject",
+                          f"Pages beyond {MAX_RESULT_WINDOW // PAGE_SIZE} are not available, narrow the filters",
+                          start_date, end_date)
+
+    for name, value in (("start_date", start_date), ("end_date", end_date)):
+        if value and resolve_date(value, now) is None:
+            return SearchCost(0, "reject",
+                              f"{name} must be an ISO 8601 date or ES date math such as now-7d",
+                              start_date, end_date)
+
+    if not start_date:
+        window = Config.SEARCH_DEFAULT_WINDOW_DAYS
+        action = "downgrade"
+        if not end_date:
+            start_date = (now - timedelta(days=window)).isoformat()
+            reason = f"No start_date given, searching the last {window} days"
+        else:
+            # Anchor the window on end_date so it never starts after it
+            start_date = (resolve_date(end_date, now, round_up=True) - timedelta(days=window)).isoformat()
+            reason = f"No start_date given, searching the {window} days up to end_date"
+
+    start = resolve_date(start_date, now)
+    end = resolve_date(end_date, now, round_up=True) if end_date else now
+    days = max(1, math.ceil((end - start).total_seconds() / 86400))
+
+    selective = bool(ip or event)
+    if not selective and days > Config.SEARCH_MAX_RANGE_DAYS:
+        return SearchCost(0, "reject",
+                          f"Searches over more than {Config.SEARCH_MAX_RANGE_DAYS} days need an ip or event filter",
+                          start_date, end_date)
+
+    cost = math.ceil(days / 7) * (1 if selective else 2) + (page - 1) // 20
+    return SearchCost(cost, action, reason, start_date, end_date)
+
+
+def exclude_indices(query: dict, indices: list) -> dict:
+    """
+    Wrap an ES query so it skips the given indices (e.g. daily indices
+    that are archived but kept, whose rows the archive already returns)
+    """
+    if not indices:
+        return query
+    return {"bool": {"must": [query], "must_not": [{"terms": {"_index": sorted(indices)}}]}}
+
+
+def archive_window(start_date: str = "", end_date: str = ""):
+    """
+    Epoch-ms (start, end) bounds for the cold-tier archive when a search
+    reaches past hot retention, None when the hot indices cover it
+    end is None for an open-ended search
+    Date math is resolved here, so "now-60d" reaches the archive too
+    """
+    now = datetime.now(timezone.utc)
+    start = resolve_date(start_date, now) if start_date else None
+    cutoff = now - timedelta(days=Config.HOT_RETENTION_DAYS)
+    if start is None or start >= cutoff:
+        return None
+
+    end = resolve_date(end_date, now, round_up=True) if end_date else None
+    if end is not None and len(end_date) == 10 and parse_date(end_date) is not None:
+        # Date-only lte covers the whole day, like ES does
+        end += timedelta(days=1, milliseconds=-1)
+
+    return (
+        int(start.timestamp() * 1000),
+        int(end.timestamp() * 1000) if end is not None else None
+    )
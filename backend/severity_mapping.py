@@ -1,8 +1,17 @@
 """
 Event Type -> Severity Mapping for SIEM logs
 Based on security risk assessment
+
+The mapping is versioned: SEVERITY_MAPPING below is the built-in version,
+a newer one can be loaded from a JSON file or MongoDB (SEVERITY_MAPPING_SOURCE)
+and is hot-reloaded. reclassify.py re-stamps stored severities when it changes.
 """
 
+from config import Config
+from models.severity_store import SeverityMappingStore
+
+SEVERITY_MAPPING_VERSION = 1
+
 SEVERITY_MAPPING = {
     # CRITICAL - Immediate threat to system
     "brute_force_attack": "critical",
@@ -62,19 +71,60 @@ SEVERITY_MAPPING = {
     "audit_log_cleared": "medium",  # Suspicious
 }
 
+mapping_store = SeverityMappingStore(
+    SEVERITY_MAPPING_VERSION,
+    SEVERITY_MAPPING,
+    source=Config.SEVERITY_MAPPING_SOURCE,
+    file_path=Config.SEVERITY_MAPPING_FILE,
+    reload_seconds=Config.SEVERITY_RELOAD_SECONDS
+)
+
 def get_severity(event_name: str) -> str:
     """
-    Get severity level for an event type
+    Get severity level for an event type with the current mapping
     Returns: 'low', 'medium', 'high', 'critical'
     """
+    return classify(event_name, mapping_store.current()[1])
+
+def get_severity_version() -> int:
+    """
+    Version of the mapping get_severity() is using
+    """
+    return mapping_store.current()[0]
+
+def severity_of(src: dict) -> tuple:
+    """
+    (severity, mapping version) for a log document
+    Uses the severity stored by re-classification when present,
+    otherwise computes it with the current mapping
+    """
+    if src.get("severity_version") is not None and src.get("severity"):
+        return src["severity"], src["severity_version"]
+    version, mapping = mapping_store.current()
+    return classify(src.get("event") or "", mapping), version
+
+def changed_severities(old_mapping: dict, new_mapping: dict) -> dict:
+    """
+    {event: new severity} for every mapped event whose severity differs
+    """
+    return {
+        event: classify(event, new_mapping)
+        for event in set(old_mapping) | set(new_mapping)
+        if classify(event, old_mapping) != classify(event, new_mapping)
+    }
+
+def classify(event_name: str, mapping: dict) -> str:
+    """
+    Severity of an event type under the given mapping
+    """
     # Try exact match first
-    if event_name in SEVERITY_MAPPING:
-        return SEVERITY_MAPPING[event_name]
+    if event_name in mapping:
+        return mapping[event_name]
     
     # Try lowercase
     event_lower = event_name.lower()
-    if event_lower in SEVERITY_MAPPING:
-        return SEVERITY_MAPPING[event_lower]
+    if event_lower in mapping:
+        return mapping[event_lower]
     
     # Check if event contains keywords
     if any(word in event_lower for word in ["error", "fail", "attack", "malware", "exploit", "breach"]):